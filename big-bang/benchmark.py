@@ -0,0 +1,258 @@
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from big_bang import read_particles, clean_input, beginning_of_time, bouncing
+
+
+ENGINES = {
+	'aggregate' : False,
+	'per_particle' : True
+}
+
+
+def generate_particles(n, seconds_ago, seed = 0):
+	'''
+	Synthesizes a particle set the way the task describes it: N particles are scattered around
+	the origin by the standard normal distribution on every axis and then move along their
+	velocity vectors for K (whole) seconds.
+
+	Args:
+		n (int): number of particles
+		seconds_ago (int): K, the number of seconds since the beginning of time
+		seed (int): seed of the random generator
+	Returns:
+		positions (np.array): NumPy array with positions of particles after K seconds with shape (n, 2)
+		movements (np.array): NumPy array with velocity vectors of particles with shape (n, 2)
+		boundary (int): half-length of a square which contains all of the particles
+	'''
+	rng = np.random.default_rng(seed)
+	positions = rng.standard_normal(size = (n, 2))
+	movements = rng.uniform(-3, 3, size = (n, 2))
+	positions += seconds_ago * movements
+	boundary = int(np.ceil(np.max(np.abs(positions)))) + 1
+
+	return positions, movements, boundary
+
+
+def to_input_text(positions, movements, boundary, seconds, probability):
+	'''
+	Formats a particle set in the input format expected by read_particles.
+
+	Args:
+		positions (np.array): NumPy array with positions of particles with shape (n, 2)
+		movements (np.array): NumPy array with velocity vectors of particles with shape (n, 2)
+		boundary (int): S, half-length of square sides
+		seconds (int): T, number of seconds during which particles bounce
+		probability (float): P, probability of a particle NOT being absorbed
+	Returns:
+		text (str): the whole standard input as one string
+	'''
+	buffer = io.StringIO()
+	buffer.write('{} {} {} {}\n'.format(positions.shape[0], boundary, seconds, probability))
+	np.savetxt(buffer, np.hstack([positions, movements]), fmt = '%.6f')
+
+	return buffer.getvalue()
+
+
+def measure(function, *args, memory = False, **kwargs):
+	'''
+	Calls a function and measures its wall time. Tracing allocations slows pure Python code
+	down several times, so with memory the function is called a second time under tracemalloc
+	only to find its peak memory.
+
+	Returns:
+		result: whatever the function returned
+		elapsed (float): wall time in seconds of the untraced call
+		peak (int): peak memory allocated during the traced call in bytes, None without memory
+	'''
+	start = time.perf_counter()
+	result = function(*args, **kwargs)
+	elapsed = time.perf_counter() - start
+
+	peak = None
+	if memory:
+		tracemalloc.start()
+		function(*args, **kwargs)
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+
+	return result, elapsed, peak
+
+
+def parse_input(text):
+	stdin = sys.stdin
+	sys.stdin = io.StringIO(text)
+	try:
+		first_line, particles = read_particles()
+	finally:
+		sys.stdin = stdin
+
+	return clean_input(particles, first_line['N'])
+
+
+def check_engines(results):
+	'''
+	Compares outputs of all engines for one (N, T) point against the first engine.
+
+	Args:
+		results (dict): engine name -> (bounces, survived)
+	Returns:
+		errors (list): list of human readable mismatches, empty if every engine agrees
+	'''
+	errors = []
+	names = list(results)
+	reference_bounces, reference_survived = results[names[0]]
+	for name in names[1:]:
+		bounces, survived = results[name]
+		if bounces != reference_bounces:
+			errors.append('{}: bounces {} != {}'.format(name, bounces, reference_bounces))
+		if not np.isclose(survived, reference_survived, rtol = 1e-9, atol = 1e-9):
+			errors.append('{}: survived {} != {}'.format(name, survived, reference_survived))
+
+	return errors
+
+
+def run_benchmark(n_values, t_values, seconds_ago, probability, budget, parse_limit, seed, memory = False):
+	'''
+	Times every stage of big_bang over a grid of particle counts and bouncing durations, and
+	with memory also measures the peak memory of every stage in a separate traced run.
+
+	Points whose N * T exceeds the budget of particle-steps are skipped, as are input parsing
+	runs with more than parse_limit particles, since both would take hours on a workstation.
+
+	Returns:
+		records (list): one dictionary per measured (stage, engine, N, T) point
+		errors (list): correctness failures
+	'''
+	records = []
+	errors = []
+	for n in n_values:
+		positions, movements, boundary = generate_particles(n, seconds_ago, seed)
+
+		if n <= parse_limit:
+			text = to_input_text(positions, movements, boundary, 1, probability)
+			(parsed_positions, parsed_movements), elapsed, peak = measure(parse_input, text, memory = memory)
+			records.append({'stage' : 'parse', 'engine' : '-', 'N' : n, 'T' : None, 'seconds' : elapsed, 'peak_bytes' : peak})
+			if not np.allclose(parsed_positions, positions, atol = 1e-5):
+				errors.append('parse N={}: positions differ from generated input'.format(n))
+
+		seconds, elapsed, peak = measure(beginning_of_time, positions, movements, memory = memory)
+		records.append({'stage' : 'beginning_of_time', 'engine' : '-', 'N' : n, 'T' : None, 'seconds' : elapsed, 'peak_bytes' : peak})
+		if seconds != seconds_ago:
+			errors.append('beginning_of_time N={}: got K={}, expected {}'.format(n, seconds, seconds_ago))
+
+		for t in t_values:
+			if n * t > budget:
+				continue
+			results = {}
+			for engine, per_particle in ENGINES.items():
+				result, elapsed, peak = measure(
+					bouncing,
+					positions,
+					movements,
+					boundary,
+					t,
+					probability,
+					per_particle = per_particle,
+					memory = memory
+					)
+				results[engine] = result[:2]
+				records.append({'stage' : 'bouncing', 'engine' : engine, 'N' : n, 'T' : t, 'seconds' : elapsed, 'peak_bytes' : peak})
+			errors.extend('bouncing N={} T={}: {}'.format(n, t, error) for error in check_engines(results))
+
+	return records, errors
+
+
+def scaling_exponent(sizes, times):
+	'''
+	Slope of log(time) against log(size), i.e. the k in time ~ size^k.
+	'''
+	if len(sizes) < 2:
+		return float('nan')
+
+	return np.polyfit(np.log(sizes), np.log(times), 1)[0]
+
+
+def format_report(records, errors):
+	lines = []
+	curves = {}
+	for record in records:
+		# Curves over N for every fixed T, and over T for every fixed N for the bouncing stage
+		curves.setdefault((record['stage'], record['engine'], 'N', record['T']), []).append((record['N'], record))
+		if record['T'] is not None:
+			curves.setdefault((record['stage'], record['engine'], 'T', record['N']), []).append((record['T'], record))
+
+	stages = ['parse', 'beginning_of_time', 'bouncing']
+	order = sorted(curves, key = lambda key: (stages.index(key[0]), key[1], key[2], key[3] or 0))
+	for stage, engine, axis, fixed in order:
+		points = curves[(stage, engine, axis, fixed)]
+		if len(points) < 2 and axis == 'T':
+			continue
+		if fixed is None:
+			header = '{} [{}] over {}'.format(stage, engine, axis)
+		else:
+			header = '{} [{}] over {} ({}={})'.format(stage, engine, axis, 'N' if axis == 'T' else 'T', fixed)
+		sizes = [size for size, _ in points]
+		times = [record['seconds'] for _, record in points]
+		lines.append('{}  ~ {}^{:.2f}'.format(header, axis, scaling_exponent(sizes, times)))
+		for size, record in points:
+			if record['peak_bytes'] is None:
+				lines.append('  {}={:<12d} {:>12.6f} s'.format(axis, size, record['seconds']))
+			else:
+				lines.append('  {}={:<12d} {:>12.6f} s {:>12.1f} MiB'.format(
+					axis, size, record['seconds'], record['peak_bytes'] / 2 ** 20))
+		lines.append('')
+
+	if errors:
+		lines.append('CORRECTNESS FAILURES:')
+		lines.extend('  ' + error for error in errors)
+	else:
+		lines.append('All correctness checks passed.')
+
+	return '\n'.join(lines)
+
+
+def parse_arguments():
+	parser = argparse.ArgumentParser(description = 'Benchmark and scaling suite for big_bang.')
+	parser.add_argument('--n', type = int, nargs = '+', default = [10 ** 3, 10 ** 4, 10 ** 5],
+		help = 'particle counts (the task allows up to 10^8)')
+	parser.add_argument('--t', type = int, nargs = '+', default = [10, 100, 1000],
+		help = 'bouncing durations in seconds (the task allows up to 10^9)')
+	parser.add_argument('--k', type = int, default = 20, help = 'seconds since the beginning of time')
+	parser.add_argument('--p', type = float, default = 0.9, help = 'probability of NOT being absorbed')
+	parser.add_argument('--budget', type = float, default = 10 ** 8,
+		help = 'skip bouncing points with N * T above this number of particle-steps')
+	parser.add_argument('--parse-limit', type = int, default = 10 ** 6,
+		help = 'skip input parsing above this number of particles')
+	parser.add_argument('--seed', type = int, default = 0)
+	parser.add_argument('--memory', action = 'store_true',
+		help = 'also measure peak memory, every stage then runs a second time under tracemalloc')
+	parser.add_argument('--json', help = 'also write raw measurements to this file')
+
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	arguments = parse_arguments()
+	records, errors = run_benchmark(
+		arguments.n,
+		arguments.t,
+		arguments.k,
+		arguments.p,
+		arguments.budget,
+		arguments.parse_limit,
+		arguments.seed,
+		memory = arguments.memory
+		)
+	print(format_report(records, errors))
+	if arguments.json:
+		with open(arguments.json, 'w') as file:
+			json.dump({'records' : records, 'errors' : errors}, file, indent = 2)
+	if errors:
+		sys.exit(1)
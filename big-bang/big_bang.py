@@ -1,4 +1,5 @@
 import numpy as np 
+import sys
 
 
 def read_particles():
@@ -81,7 +82,7 @@ def beginning_of_time(positions, movements):
 			return seconds
 
 
-def bouncing(positions, movements, boundary, seconds, probability):
+def bouncing(positions, movements, boundary, seconds, probability, per_particle = False):
 
 	# TODO ACCOUNT FOR POSSIBLY HITTING THE CORNER?
 
@@ -109,9 +110,14 @@ def bouncing(positions, movements, boundary, seconds, probability):
 		movements (np.array): NumPy array with velocity vectors of particles (N of particles, 2)
 		boundary (float): boundary of square
 		seconds (int): Number of seconds during which the particles will move
+		probability (float): Probability of a particle NOT being absorbed after a bounce
+		per_particle (bool): If True, keep an int32 bounce counter per particle instead of
+			the running survival probabilities and return it as well
 	Returns:
 		bounces (int): The total number of bounces during K seconds
 		survived (float): The expected number of particles after K seconds
+		bounce_counts (np.array): Only if per_particle is True. NumPy int32 array with the
+			number of bounces of each particle, shape (N of particles,)
 	'''
 
 	negative_boundary = np.negative(boundary)
@@ -119,11 +125,14 @@ def bouncing(positions, movements, boundary, seconds, probability):
 	new_positions = positions.copy()
 	bounce_movements = movements.copy()
 	bounces = 0
-	probabilities = np.array(
-		np.ones(
-			shape = (np.shape(new_positions)[0], 1)
-			)
-		) # Starting probability of survival is 1 for each particle
+	if per_particle:
+		bounce_counts = np.zeros(shape = np.shape(new_positions)[0], dtype = np.int32)
+	else:
+		probabilities = np.array(
+			np.ones(
+				shape = (np.shape(new_positions)[0], 1)
+				)
+			) # Starting probability of survival is 1 for each particle
 
 
 	for i in range(1, seconds + 1):
@@ -148,10 +157,17 @@ def bouncing(positions, movements, boundary, seconds, probability):
 			new_positions[positive_y_bounces, 1] = positive_boundary - positive_y_difference 
 			new_positions[negative_y_bounces, 1] = negative_boundary - negative_y_difference 
 
-			probabilities[positive_x_bounces] = probabilities[positive_x_bounces] * probability
-			probabilities[negative_x_bounces] = probabilities[negative_x_bounces] * probability
-			probabilities[positive_y_bounces] = probabilities[positive_y_bounces] * probability
-			probabilities[negative_y_bounces] = probabilities[negative_y_bounces] * probability
+			if per_particle:
+				# Indices are unique within each array, so fancy-index increments are safe
+				bounce_counts[positive_x_bounces] += 1
+				bounce_counts[negative_x_bounces] += 1
+				bounce_counts[positive_y_bounces] += 1
+				bounce_counts[negative_y_bounces] += 1
+			else:
+				probabilities[positive_x_bounces] = probabilities[positive_x_bounces] * probability
+				probabilities[negative_x_bounces] = probabilities[negative_x_bounces] * probability
+				probabilities[positive_y_bounces] = probabilities[positive_y_bounces] * probability
+				probabilities[negative_y_bounces] = probabilities[negative_y_bounces] * probability
 
 			# Change the sign of movement vectors
 			bounce_movements[positive_x_bounces, 0] = np.negative(bounce_movements[positive_x_bounces, 0])
@@ -159,16 +175,58 @@ def bouncing(positions, movements, boundary, seconds, probability):
 			bounce_movements[positive_y_bounces, 1] = np.negative(bounce_movements[positive_y_bounces, 1])
 			bounce_movements[negative_y_bounces, 1] = np.negative(bounce_movements[negative_y_bounces, 1])
 
+	if per_particle:
+		expected_survived = np.sum(np.power(probability, bounce_counts, dtype = np.float64))
+		return bounces, expected_survived, bounce_counts
+
 	expected_survived = np.sum(probabilities)
 
 	return bounces, expected_survived
 
 
+def survival_distribution(bounce_counts, probability):
+	'''
+	Summarizes per-particle bounce counters returned by bouncing(..., per_particle = True).
+
+	Particle j survives with probability p^i_j where i_j is its number of bounces, so the number
+	of survivors is a sum of independent Bernoulli(p^i_j) variables. Its mean is the sum of p^i_j
+	and its variance is the sum of p^i_j * (1 - p^i_j).
+
+	Args:
+		bounce_counts (np.array): NumPy integer array with the number of bounces of each particle
+		probability (float): Probability of a particle NOT being absorbed after a bounce
+	Returns:
+		histogram (np.array): NumPy array where histogram[i] is the number of particles that bounced i times
+		mean (float): The expected number of particles that survived
+		variance (float): The variance of the number of particles that survived
+	'''
+	histogram = np.bincount(bounce_counts)
+	# Every particle with the same number of bounces has the same survival probability
+	survival = np.power(probability, np.arange(histogram.size), dtype = np.float64)
+	mean = np.sum(histogram * survival)
+	variance = np.sum(histogram * survival * (1 - survival))
+
+	return histogram, mean, variance
+
+
 
-def run_program():
+def run_program(per_particle = False):
 	first_line, particles = read_particles()
 	positions, movements = clean_input(particles, first_line['N'])
 	seconds = beginning_of_time(positions, movements)
+	if per_particle:
+		bounces, survived, bounce_counts = bouncing(
+			positions, 
+			movements, 
+			first_line['S'], 
+			first_line['T'], 
+			first_line['P'],
+			per_particle = True
+			)
+		histogram, survived, variance = survival_distribution(bounce_counts, first_line['P'])
+
+		return seconds, bounces, survived, histogram, variance
+
 	bounces, survived = bouncing(
 		positions, 
 		movements, 
@@ -180,5 +238,11 @@ def run_program():
 	return seconds, bounces, survived
 
 if __name__ == '__main__':
-	seconds, bounces, survived = run_program()
-	print(seconds, bounces, survived)
\ No newline at end of file
+	if '--distribution' in sys.argv[1:]:
+		seconds, bounces, survived, histogram, variance = run_program(per_particle = True)
+		print(seconds, bounces, survived)
+		print(variance)
+		print(' '.join(str(count) for count in histogram))
+	else:
+		seconds, bounces, survived = run_program()
+		print(seconds, bounces, survived)
\ No newline at end of file
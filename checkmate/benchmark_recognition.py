@@ -0,0 +1,212 @@
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import traceback
+from collections import Counter
+
+import numpy as np
+from PIL import Image
+
+import bitboard
+from checkmate import load_images, merge_images, assets_fingerprint, squares_to_fen, recognize_board, clear_caches
+
+
+STAGES = ['decode', 'localize', 'templates', 'match', 'rules']
+PIECE_WEIGHTS = 'QRRBBNNPPPPPPPP'
+
+
+def random_position(rng, max_pieces = 24):
+	'''
+	Random legal-ish position: both kings are on the board and not next to each other, pawns are
+	not on the first or last row, and at most one king is in check.
+
+	Returns:
+		squares (list): 64 characters in FEN order, '*' for empty squares
+	'''
+	while True:
+		squares = ['*'] * 64
+		free = list(range(64))
+		rng.shuffle(free)
+		white_king, black_king = free.pop(), free.pop()
+		if abs(white_king // 8 - black_king // 8) <= 1 and abs(white_king % 8 - black_king % 8) <= 1:
+			continue
+		squares[white_king] = 'K'
+		squares[black_king] = 'k'
+		for i in range(rng.randint(0, max_pieces)):
+			piece = rng.choice(PIECE_WEIGHTS)
+			piece = piece if rng.random() < 0.5 else piece.lower()
+			square = free.pop()
+			if piece in 'Pp' and square // 8 in (0, 7):
+				continue
+			squares[square] = piece
+		position = bitboard.from_matrix([''.join(squares[row * 8 : row * 8 + 8]) for row in range(8)])
+		if not (bitboard.in_check(position, True) and bitboard.in_check(position, False)):
+			return squares
+
+
+def render_board(squares, tiles, white_pieces, black_pieces, tile_size, offset, canvas_size):
+	'''
+	Renders a screenshot of a position: the chessboard is pasted onto a black canvas, which is
+	what get_xy expects around the board. Every square is merged with merge_images at sprite
+	resolution and then resized to the tile size, the same way the templates are built.
+
+	Args:
+		squares (list): 64 characters in FEN order, '*' for empty squares
+		tiles, white_pieces, black_pieces (dict): sprites as returned by load_images
+		tile_size (int): size of one tile in pixels
+		offset (tuple): (row, column) of the top left pixel of the chessboard
+		canvas_size (tuple): (height, width) of the screenshot
+	Returns:
+		image (PIL.Image): RGB screenshot
+	'''
+	cache = {}
+	board = Image.new('LA', (tile_size * 8, tile_size * 8))
+	for square, piece in enumerate(squares):
+		row, column = divmod(square, 8)
+		# a8 is a white tile
+		tile = 'white' if (row + column) % 2 == 0 else 'black'
+		if (tile, piece) not in cache:
+			if piece == '*':
+				image = tiles[tile]
+			else:
+				image = merge_images(tiles[tile], white_pieces[piece] if piece.isupper() else black_pieces[piece])
+			cache[(tile, piece)] = image.resize((tile_size, tile_size), resample = Image.BILINEAR)
+		board.paste(cache[(tile, piece)], (column * tile_size, row * tile_size))
+
+	canvas = Image.new('RGB', (canvas_size[1], canvas_size[0]), (0, 0, 0))
+	canvas.paste(board.convert('RGB'), (offset[1], offset[0]))
+
+	return canvas
+
+
+def generate_dataset(path, n_of_images, tile_sizes, seed = 0, fractional = False, jpeg_quality = None):
+	'''
+	Yields (image bytes, label) pairs, where label has the corner and the FEN of the rendered board.
+	Tile sizes are drawn from tile_sizes and black borders around the board are random.
+
+	With fractional, a random fraction of a pixel is added to the tile size: the board is
+	rendered at sprite resolution and the whole board is resized to the non-integer scale,
+	the way a browser would scale it. With jpeg_quality, images are saved as JPEG instead of PNG.
+	'''
+	rng = random.Random(seed)
+	tiles, white_pieces, black_pieces = load_images(path)
+	for i in range(n_of_images):
+		squares = random_position(rng)
+		tile_size = rng.choice(tile_sizes)
+		offset = (rng.randint(0, 200), rng.randint(0, 200))
+		if fractional:
+			board_size = int(round((tile_size + rng.random()) * 8))
+			sprite_size = tiles['white'].size[0]
+			board = render_board(squares, tiles, white_pieces, black_pieces, sprite_size, (0, 0), (sprite_size * 8,) * 2)
+			board = board.resize((board_size, board_size), resample = Image.BILINEAR)
+		else:
+			board_size = tile_size * 8
+		canvas_size = (
+			offset[0] + board_size + rng.randint(0, 200),
+			offset[1] + board_size + rng.randint(0, 200)
+			)
+		if fractional:
+			image = Image.new('RGB', (canvas_size[1], canvas_size[0]), (0, 0, 0))
+			image.paste(board, (offset[1], offset[0]))
+		else:
+			image = render_board(squares, tiles, white_pieces, black_pieces, tile_size, offset, canvas_size)
+		buffer = io.BytesIO()
+		if jpeg_quality:
+			image.save(buffer, format = 'JPEG', quality = jpeg_quality)
+		else:
+			image.save(buffer, format = 'PNG')
+		yield buffer.getvalue(), {'corner' : offset, 'fen' : squares_to_fen(squares)[0]}
+
+
+def square_accuracy(fen, expected):
+	got = bitboard.to_matrix(bitboard.from_fen(fen))
+	expected = bitboard.to_matrix(bitboard.from_fen(expected))
+
+	return sum(a == b for got_row, expected_row in zip(got, expected) for a, b in zip(got_row, expected_row)) / 64
+
+
+def parse_arguments():
+	parser = argparse.ArgumentParser(description = 'Synthetic benchmark of chessboard recognition.')
+	parser.add_argument('assets', help = 'folder with pieces and tiles subfolders')
+	parser.add_argument('--images', type = int, default = 200)
+	parser.add_argument('--tile-sizes', type = int, nargs = '+', default = [32, 45, 60, 75, 90])
+	parser.add_argument('--seed', type = int, default = 0)
+	parser.add_argument('--fractional', action = 'store_true', help = 'render boards at non-integer scales')
+	parser.add_argument('--matching', choices = ['exact', 'ncc'], default = 'exact')
+	parser.add_argument('--tolerance', type = float, default = 0)
+	parser.add_argument('--jpeg', type = int, metavar = 'QUALITY', help = 'save images as JPEG with this quality')
+	parser.add_argument('--image-cache', action = 'store_true')
+	parser.add_argument('--save', help = 'also save the rendered images and labels.jsonl to this folder')
+
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	arguments = parse_arguments()
+	clear_caches()
+	fingerprint = assets_fingerprint(arguments.assets)
+	if arguments.save:
+		os.makedirs(arguments.save, exist_ok = True)
+		labels_file = open(os.path.join(arguments.save, 'labels.jsonl'), 'w')
+
+	timings = {stage : [] for stage in STAGES}
+	totals = []
+	failures = Counter()
+	corners = 0
+	fens = 0
+	squares = 0
+	dataset = generate_dataset(arguments.assets, arguments.images, arguments.tile_sizes, arguments.seed,
+		arguments.fractional, arguments.jpeg)
+	for i, (data, label) in enumerate(dataset):
+		if arguments.save:
+			filename = os.path.join(arguments.save, '{}.{}'.format(i, 'jpg' if arguments.jpeg else 'png'))
+			with open(filename, 'wb') as file:
+				file.write(data)
+			labels_file.write(json.dumps(dict(label, image = filename)) + '\n')
+		try:
+			image_timings = {}
+			results = recognize_board(
+				io.BytesIO(data),
+				arguments.assets,
+				fingerprint = fingerprint,
+				tolerance = arguments.tolerance,
+				image_cache = arguments.image_cache,
+				matching = arguments.matching,
+				timings = image_timings
+				)
+		except Exception as error:
+			# The first traceback is printed in full, the following failures are only counted by type
+			if not failures:
+				print('Image {} failed:'.format(i), file = sys.stderr)
+				traceback.print_exc()
+			failures[type(error).__name__] += 1
+			totals.append(float('nan'))
+			continue
+		for stage in image_timings:
+			timings[stage].append(image_timings[stage])
+		totals.append(sum(image_timings.values()))
+		corners += tuple(results[:2]) == tuple(label['corner'])
+		fens += results[2] == label['fen']
+		squares += square_accuracy(results[2], label['fen'])
+
+	totals = np.array(totals)
+	recognized = np.isfinite(totals)
+	print('Images: {}, failed: {}'.format(len(totals), int(np.sum(~recognized))))
+	for name, count in failures.most_common():
+		print('  {}: {}'.format(name, count))
+	print('Throughput: {:.1f} images/s'.format(np.sum(recognized) / np.sum(totals[recognized])))
+	print('Corner accuracy: {:.4f}'.format(corners / len(totals)))
+	print('FEN accuracy: {:.4f}'.format(fens / len(totals)))
+	print('Square accuracy: {:.4f}'.format(squares / len(totals)))
+	print()
+	print('{:<10} {:>10} {:>10} {:>10} {:>10}'.format('stage', 'p50 ms', 'p90 ms', 'p99 ms', 'share'))
+	total_time = sum(sum(values) for values in timings.values())
+	for stage in STAGES:
+		values = np.array(timings[stage]) * 1000
+		if values.size == 0:
+			continue
+		p50, p90, p99 = np.percentile(values, [50, 90, 99])
+		print('{:<10} {:>10.3f} {:>10.3f} {:>10.3f} {:>9.1f}%'.format(stage, p50, p90, p99, 100 * values.sum() / 1000 / total_time))
@@ -0,0 +1,553 @@
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+import bitboard
+
+
+# (FEN, player giving the check, is it a check mate)
+POSITIONS = [
+	('1Q5k/8/6K1/8/8/8/8/8', 'W', True), # example from the task
+	('6rk/5Npp/8/8/8/8/8/6K1', 'W', True), # smothered mate
+	('r1bqkb1r/pppp1Qpp/2n2n2/4p3/2B1P3/8/PPPP1PPP/RNB1K1NR', 'W', True), # scholar's mate
+	('R5k1/5ppp/8/8/8/8/8/6K1', 'W', True), # back rank mate
+	('6k1/5ppp/8/8/8/8/8/R5K1', '-', False),
+	('4k3/8/8/8/8/8/4r3/4K3', 'B', False), # king captures the checking rook
+	('6k1/8/8/3R4/8/8/5PPP/r5K1', 'B', False), # only a block saves the king
+	('6k1/8/8/8/8/1N6/5PPP/r5K1', 'B', False), # only a capture saves the king
+	('qr5k/8/8/4b3/8/2R5/8/K7', 'B', True), # the blocking rook is pinned
+	('r2qkb1r/ppp2ppp/3N4/8/8/8/8/4R1K1', 'W', False), # double check, only the king may move
+	('k7/8/8/8/8/3p4/4K3/8', 'B', False), # black pawn checks the white king
+	('4k3/3P4/8/8/8/8/8/4K3', 'W', False), # white pawn checks the black king
+	('4k3/4P3/8/8/8/8/8/4K3', '-', False), # pawns do not attack straight ahead
+	('7k/5Q2/6K1/8/8/8/8/8', '-', False), # stalemate
+	('4k3/8/8/8/8/5n2/8/4K3', 'B', False), # knight check
+	('8/8/8/8/8/5k2/6q1/7K', 'B', True), # protected queen
+	('r3k3/8/8/8/8/8/P7/K7', '-', False), # blocked rook
+	('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR', '-', False)
+]
+
+# (FEN, white to move, depth, leaf nodes). Only positions and depths where castling and
+# en passant cannot occur, since neither exists in the task.
+PERFT = [
+	('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR', True, 1, 20),
+	('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR', True, 2, 400),
+	('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR', True, 3, 8902),
+	('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR', True, 4, 197281),
+	('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8', True, 1, 14),
+	('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8', True, 2, 191)
+]
+
+
+# -----------------------------------------------
+# FUNCTIONS FOR CHECKING WHETHER THE CURRENT POSITION REPRESENTS A CHECK
+# The original string based engine from checkmate.py, which was replaced by bitboard.py and
+# is only kept here as the 'strings' engine to compare against.
+# Whoever is reading this: I am sorry for the ugly code I've written down here
+# but it works and I didn't have much time to come up with some more beautiful algorithm :)
+
+def check(chessboard, king_color):
+
+	if king_color == 'k':
+		opposing_pieces = {
+			'bishop' : 'B',
+			'king' : 'K',
+			'knight' : 'N',
+			'queen' : 'Q',
+			'rook' : 'R', 
+			'pawn' : 'P'
+		}
+	elif king_color == 'K':
+		opposing_pieces = {
+			'bishop' : 'b',
+			'king' : 'k',
+			'knight' : 'n',
+			'queen' : 'q',
+			'rook' : 'r', 
+			'pawn' : 'p'
+			}
+
+	king_x = 0
+	king_y = 0
+
+	for index, row in enumerate(chessboard):
+		if king_color in row:
+			king_y = row.index(king_color)
+			break
+		else:
+			king_x += 1
+
+	result = None
+	lookup_functions = [leftright_diagonal_lookup, rightleft_diagonal_lookup, vertical_lookup, horizontal_lookup, knight_lookup]
+	
+	for i in range(5):
+		result = lookup_functions[i](chessboard, king_color, king_x, king_y, opposing_pieces)
+		if result == 'chess':
+			return 'chess'
+
+	return None
+
+
+def vertical_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
+	for i in range(king_x, 8):
+		piece = chessboard[i][king_y]
+		if piece == '*' or piece == king_color:
+			continue
+		elif piece not in opposing_pieces.values():
+			break
+		elif piece in opposing_pieces.values():
+			if np.abs(king_x - i) == 1:
+				if piece in [opposing_pieces['king'],opposing_pieces['queen'],opposing_pieces['rook']]:
+					return 'chess'
+				else:
+					break
+			else:
+				if piece in [opposing_pieces['queen'], opposing_pieces['rook']]:
+					return 'chess'
+				else:
+					break
+
+	for i in reversed(range(king_x)):
+		piece = chessboard[i][king_y]
+		if piece == '*' or piece == king_color:
+			continue
+		elif piece not in opposing_pieces.values():
+			break
+		elif piece in opposing_pieces.values():
+			if np.abs(king_x - i) == 1:
+				if piece in [opposing_pieces['king'],opposing_pieces['queen'],opposing_pieces['rook']]:
+					return 'chess'
+				else:
+					break
+			else:
+				if piece in [opposing_pieces['queen'], opposing_pieces['rook']]:
+					return 'chess'
+				else:
+					break
+
+	return None
+
+
+def horizontal_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
+	for i in range(king_y, 8):
+		piece = chessboard[king_x][i]
+		if piece == '*' or piece == king_color:
+			continue
+		elif piece not in opposing_pieces.values():
+			break
+		elif piece in opposing_pieces.values():
+			if np.abs(king_y - i) == 1:
+				if piece in [opposing_pieces['king'],opposing_pieces['queen'],opposing_pieces['rook']]:
+					return 'chess'
+				else:
+					break
+			else:
+				if piece in [opposing_pieces['queen'], opposing_pieces['rook']]:
+					return 'chess'
+				else:
+					break
+
+	for i in reversed(range(king_y)):
+		piece = chessboard[king_x][i]
+		if piece == '*' or piece == king_color:
+			continue
+		elif piece not in opposing_pieces.values():
+			break
+		elif piece in opposing_pieces.values():
+			if np.abs(king_y - i) == 1:
+				if piece in [opposing_pieces['king'], opposing_pieces['queen'],opposing_pieces['rook']]:
+					return 'chess'
+				else:
+					break 
+			else:
+				if piece in [opposing_pieces['queen'], opposing_pieces['rook']]:
+					return 'chess'
+				else:
+					break
+
+	return None
+
+
+def knight_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
+	possible_indices = zip(
+			[
+				king_x - 1, king_x - 1, king_x - 2, king_x - 2,
+				king_x + 1, king_x + 1, king_x + 2, king_x + 2 
+			],
+			[
+				king_y - 2, king_y + 2, king_y - 1, king_y + 1,
+				king_y - 2, king_y + 2, king_y - 1, king_y + 1
+			]
+		)
+
+	for idx_comb in possible_indices:
+		try:
+			if opposing_pieces['knight'] == chessboard[idx_comb[0]][idx_comb[1]]:
+				return 'chess'
+			else:
+				continue
+		except IndexError:
+			continue
+
+	return None
+
+
+def leftright_diagonal_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
+	x = king_x
+	y = king_y
+	for i in range(king_x, 8):
+		if (x > 7 or y > 7) or (x < 0 or y < 0):
+			break 
+		piece = chessboard[x][y]
+		if piece == '*' or piece == king_color:
+			x += 1
+			y += 1
+			continue 
+		elif piece not in opposing_pieces.values():
+			break
+		elif piece in opposing_pieces.values():
+			if king_color == 'k':
+				if (x - king_x == 1) and (y - king_y == 1):
+					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
+						return 'chess'
+					else:
+						break
+				else:
+					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
+						return 'chess'
+			elif king_color == 'K':
+				if (king_x - 1 == 1) and (king_y - 1 == 1):
+					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
+						return 'chess'
+					else:
+						break
+				else:
+					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
+						return 'chess'
+	x = king_x 
+	y = king_y
+
+	for i in reversed(range(king_x)):
+		if (x > 7 or y > 7) or (x < 0 or y < 0):
+			break 
+		piece = chessboard[x][y]
+		if piece == '*' or piece == king_color:
+			x -= 1
+			y -= 1
+			continue 
+		elif piece not in opposing_pieces.values():
+			break
+		elif piece in opposing_pieces.values():
+			if king_color == 'k':
+				if (x - king_x == 1) and (y - king_y == 1):
+					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
+						return 'chess'
+					else:
+						break
+				else:
+					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
+						return 'chess'
+			elif king_color == 'K':
+				if (king_x - x == 1) and (king_y - y == 1):
+					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
+						return 'chess'
+					else:
+						break
+				else:
+					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
+						return 'chess'
+
+
+	return None 
+
+
+def rightleft_diagonal_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
+	x = king_x
+	y = king_y
+
+	for i in range(king_x, 8):
+		if (x > 7 or y > 7) or (x < 0 or y < 0):
+			break 
+		piece = chessboard[x][y]
+		if piece == '*' or piece == king_color:
+			x += 1
+			y -= 1
+			continue 
+		elif piece not in opposing_pieces.values():
+			break
+		elif piece in opposing_pieces.values():
+			if king_color == 'k':
+				if (x - king_x == 1) and (y - king_y == -1):
+					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
+						return 'chess'
+					else:
+						break
+				else:
+					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
+						return 'chess'
+			elif king_color == 'K':
+				if (king_x - x == 1) and (y - king_y == 1):
+					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
+						return 'chess'
+					else:
+						break
+				else:
+					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
+						return 'chess'
+	x = king_x 
+	y = king_y
+
+	for i in reversed(range(king_x)):
+		if (x > 7 or y > 7) or (x < 0 or y < 0):
+			break 
+		piece = chessboard[x][y]
+		if piece == '*' or piece == king_color:
+			x -= 1
+			y += 1
+			continue 
+		elif piece not in opposing_pieces.values():
+			break
+		elif piece in opposing_pieces.values():
+			if king_color == 'k':
+				if (x - king_x == 1) and (y - king_y == -1):
+					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
+						return 'chess'
+					else:
+						break
+				else:
+					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
+						return 'chess'
+			elif king_color == 'K':
+				if (king_x - x == 1) and (y - king_y == 1):
+					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
+						return 'chess'
+					else:
+						break
+				else:
+					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
+						return 'chess'
+
+	return None 
+
+
+def move_king(chessboard, king_color):
+	# OVO NIJE DOBRO, AKO NE SREDIS DO SUTRA ONDA BRISI
+	if king_color == 'k':
+		opposing_pieces = {
+			'bishop' : 'B',
+			'king' : 'K',
+			'knight' : 'N',
+			'queen' : 'Q',
+			'rook' : 'R', 
+			'pawn' : 'P'
+		}
+	elif king_color == 'K':
+		opposing_pieces = {
+			'bishop' : 'b',
+			'king' : 'k',
+			'knight' : 'n',
+			'queen' : 'q',
+			'rook' : 'r', 
+			'pawn' : 'p'
+			}
+
+	king_x = 0
+	king_y = 0
+
+	for index, row in enumerate(chessboard):
+		if king_color in row:
+			king_y = row.index(king_color)
+			break
+		else:
+			king_x += 1
+
+	new_chessboard = chessboard.copy()
+	movements = [
+		(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)
+		]
+	for movement in movements:
+		x = king_x + movement[0]
+		y = king_y + movement[1]
+		if x < 0 or y < 0:
+			continue
+		try:
+			tile = new_chessboard[x][y]
+			if tile == '*' or tile in opposing_pieces.values():
+				new_chessboard[x] = new_chessboard[x][:y] + king_color + new_chessboard[x][y + 1:]
+				new_chessboard[king_x] = new_chessboard[king_x][:king_y] + '*' + new_chessboard[king_x][king_y + 1:]
+				result = check(new_chessboard, king_color)
+				if result:
+					new_chessboard = chessboard.copy()
+					continue
+				elif not result:
+					return 'not_check_mate'
+			else:
+				continue
+		except IndexError:
+			continue
+
+	return 'check_mate'
+
+
+def bitboard_check(fen):
+	return bitboard.get_checking_player(bitboard.from_fen(fen))
+
+
+def bitboard_mate(fen):
+	player, check_mate = bitboard.evaluate(bitboard.from_fen(fen))
+
+	return player, check_mate == 'check_mate'
+
+
+def strings_check(fen):
+	'''
+	The original string based check detection.
+	'''
+	chessboard_matrix = bitboard.to_matrix(bitboard.from_fen(fen))
+	try:
+		if check(chessboard_matrix, 'k') == 'chess':
+			return 'W'
+		if check(chessboard_matrix, 'K') == 'chess':
+			return 'B'
+	except Exception:
+		return None
+
+	return '-'
+
+
+def strings_mate(fen):
+	'''
+	The original string based detection, where only king moves can escape a check.
+	'''
+	player = strings_check(fen)
+	if player not in ('W', 'B'):
+		return player, False
+	chessboard_matrix = bitboard.to_matrix(bitboard.from_fen(fen))
+	try:
+		result = move_king(chessboard_matrix, 'k' if player == 'W' else 'K')
+	except Exception:
+		return player, None
+
+	return player, result == 'check_mate'
+
+
+ENGINES = {
+	'bitboard' : (bitboard_check, bitboard_mate),
+	'strings' : (strings_check, strings_mate)
+}
+
+
+def random_fen(rng, n_of_pieces):
+	'''
+	Random placement of both kings and n_of_pieces other pieces, not necessarily a legal position.
+	'''
+	squares = rng.sample(range(64), n_of_pieces + 2)
+	board = ['*'] * 64
+	board[squares[0]] = 'K'
+	board[squares[1]] = 'k'
+	for square in squares[2:]:
+		board[square] = rng.choice('QRBNqrbn' + 'Pp' * 2)
+	rows = []
+	for row in range(8):
+		line = ''
+		empty_tiles = 0
+		for piece in board[row * 8 : row * 8 + 8]:
+			if piece == '*':
+				empty_tiles += 1
+				continue
+			if empty_tiles:
+				line += str(empty_tiles)
+				empty_tiles = 0
+			line += piece
+		rows.append(line + (str(empty_tiles) if empty_tiles else ''))
+
+	return '/'.join(rows)
+
+
+def validate(engine):
+	'''
+	Returns:
+		failures (list): (FEN, expected, got) for every curated position the engine gets wrong
+	'''
+	check_function, mate_function = ENGINES[engine]
+	failures = []
+	for fen, player, is_mate in POSITIONS:
+		got = mate_function(fen)
+		if got != (player, is_mate):
+			failures.append((fen, (player, is_mate), got))
+
+	return failures
+
+
+def run_perft():
+	'''
+	Returns:
+		results (list): (FEN, depth, expected nodes, nodes, seconds) for every perft position
+	'''
+	results = []
+	for fen, white, depth, expected in PERFT:
+		start = time.perf_counter()
+		nodes = bitboard.perft(bitboard.from_fen(fen), white, depth)
+		results.append((fen, depth, expected, nodes, time.perf_counter() - start))
+
+	return results
+
+
+def throughput(function, fens):
+	start = time.perf_counter()
+	for fen in fens:
+		function(fen)
+
+	return len(fens) / (time.perf_counter() - start)
+
+
+def parse_arguments():
+	parser = argparse.ArgumentParser(description = 'Correctness and throughput benchmark of checkmate rules.')
+	parser.add_argument('--random', type = int, default = 20000, help = 'number of random positions for throughput')
+	parser.add_argument('--repeat', type = int, default = 200, help = 'how many times the curated positions are timed')
+	parser.add_argument('--seed', type = int, default = 0)
+
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	arguments = parse_arguments()
+	rng = random.Random(arguments.seed)
+	random_fens = [random_fen(rng, rng.randint(0, 20)) for i in range(arguments.random)]
+	curated_fens = [fen for fen, player, is_mate in POSITIONS] * arguments.repeat
+	failed = False
+
+	print('Curated positions ({}):'.format(len(POSITIONS)))
+	for engine in ENGINES:
+		failures = validate(engine)
+		print('  {:<10} {} passed, {} failed'.format(engine, len(POSITIONS) - len(failures), len(failures)))
+		for fen, expected, got in failures:
+			print('    {:<60} expected {} got {}'.format(fen, expected, got))
+		if engine == 'bitboard' and failures:
+			failed = True
+
+	print()
+	print('Perft:')
+	for fen, depth, expected, nodes, seconds in run_perft():
+		status = 'ok' if nodes == expected else 'FAILED, expected {}'.format(expected)
+		print('  {:<48} depth {} {:>8} nodes {:>10.0f} nodes/s {}'.format(fen, depth, nodes, nodes / seconds, status))
+		if nodes != expected:
+			failed = True
+
+	print()
+	print('Throughput (positions per second):')
+	print('  {:<10} {:>14} {:>14} {:>14} {:>14}'.format('engine', 'check curated', 'mate curated', 'check random', 'mate random'))
+	for engine, (check_function, mate_function) in ENGINES.items():
+		print('  {:<10} {:>14.0f} {:>14.0f} {:>14.0f} {:>14.0f}'.format(
+			engine,
+			throughput(check_function, curated_fens),
+			throughput(mate_function, curated_fens),
+			throughput(check_function, random_fens),
+			throughput(mate_function, random_fens)
+			))
+
+	if failed:
+		sys.exit(1)
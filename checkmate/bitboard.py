@@ -0,0 +1,481 @@
+'''
+Bitboard representation of a chess position and a fast attack engine.
+
+A position is a dictionary which maps every piece character used in FEN ('K', 'q', 'n', ...)
+to a 64-bit integer. Bit number row * 8 + column is set if the piece stands on that square,
+where row 0 is the 8th rank and column 0 is the a-file. This is the same order in which squares
+appear in FEN and in the chessboard matrix used by checkmate.py, so a8 is bit 0 and h1 is bit 63.
+'''
+import random
+
+
+WHITE_PIECES = 'KQRBNP'
+BLACK_PIECES = 'kqrbnp'
+PIECES = WHITE_PIECES + BLACK_PIECES
+FULL_BOARD = (1 << 64) - 1
+
+# (row, column) steps. Directions with a positive index step are scanned towards higher bits.
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+KNIGHT_STEPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+
+def square_index(row, column):
+	return row * 8 + column
+
+
+def _step_table(steps):
+	table = []
+	for square in range(64):
+		row, column = divmod(square, 8)
+		attacks = 0
+		for row_step, column_step in steps:
+			new_row = row + row_step
+			new_column = column + column_step
+			if 0 <= new_row < 8 and 0 <= new_column < 8:
+				attacks |= 1 << square_index(new_row, new_column)
+		table.append(attacks)
+
+	return table
+
+
+def _ray_table(direction):
+	row_step, column_step = direction
+	table = []
+	for square in range(64):
+		row, column = divmod(square, 8)
+		ray = 0
+		row += row_step
+		column += column_step
+		while 0 <= row < 8 and 0 <= column < 8:
+			ray |= 1 << square_index(row, column)
+			row += row_step
+			column += column_step
+		table.append(ray)
+
+	return table
+
+
+KNIGHT_ATTACKS = _step_table(KNIGHT_STEPS)
+KING_ATTACKS = _step_table(KING_STEPS)
+# White pawns move towards row 0, black pawns towards row 7
+PAWN_ATTACKS = {
+	True : _step_table([(-1, -1), (-1, 1)]),
+	False : _step_table([(1, -1), (1, 1)])
+}
+RAYS = {direction : _ray_table(direction) for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+# Rays that go towards higher bits find their first blocker with the lowest set bit,
+# the others with the highest set bit
+POSITIVE = {direction : direction[0] * 8 + direction[1] > 0 for direction in RAYS}
+
+
+def _between_table():
+	table = [[0] * 64 for square in range(64)]
+	for direction, rays in RAYS.items():
+		for square in range(64):
+			ray = rays[square]
+			target_bits = ray
+			while target_bits:
+				target_bit = target_bits & -target_bits
+				target = target_bit.bit_length() - 1
+				table[square][target] = ray & ~rays[target] & ~target_bit
+				target_bits ^= target_bit
+
+	return table
+
+
+# Squares strictly between two squares on the same line, 0 if they are not on a common line
+BETWEEN = _between_table()
+
+
+def _zobrist_table(seed = 2020):
+	rng = random.Random(seed)
+
+	return {piece : [rng.getrandbits(64) for square in range(64)] for piece in PIECES}
+
+
+# Random 64-bit key for every piece on every square, fixed by the seed so that hashes are the
+# same in every process
+ZOBRIST = _zobrist_table()
+
+
+def zobrist_hash(position):
+	'''
+	XOR of the keys of all pieces on their squares. Equal positions always have equal hashes
+	and different positions collide with probability of about 2^-64.
+	'''
+	key = 0
+	for piece, bitboard in position.items():
+		keys = ZOBRIST[piece]
+		while bitboard:
+			lowest = bitboard & -bitboard
+			key ^= keys[lowest.bit_length() - 1]
+			bitboard ^= lowest
+
+	return key
+
+
+def lowest_bit(bitboard):
+	return (bitboard & -bitboard).bit_length() - 1
+
+
+def iterate_bits(bitboard):
+	'''
+	Yields indices of all set bits, lowest first.
+	'''
+	while bitboard:
+		lowest = bitboard & -bitboard
+		yield lowest.bit_length() - 1
+		bitboard ^= lowest
+
+
+def ray_attacks(square, occupied, direction):
+	'''
+	Squares attacked from square along one direction, up to and including the first blocker.
+	'''
+	ray = RAYS[direction][square]
+	blockers = ray & occupied
+	if not blockers:
+		return ray
+	if POSITIVE[direction]:
+		blocker = (blockers & -blockers).bit_length() - 1
+	else:
+		blocker = blockers.bit_length() - 1
+
+	return ray ^ RAYS[direction][blocker]
+
+
+def rook_attacks(square, occupied):
+	return (ray_attacks(square, occupied, (-1, 0)) | ray_attacks(square, occupied, (1, 0)) |
+		ray_attacks(square, occupied, (0, -1)) | ray_attacks(square, occupied, (0, 1)))
+
+
+def bishop_attacks(square, occupied):
+	return (ray_attacks(square, occupied, (-1, -1)) | ray_attacks(square, occupied, (-1, 1)) |
+		ray_attacks(square, occupied, (1, -1)) | ray_attacks(square, occupied, (1, 1)))
+
+
+def empty_position():
+	return {piece : 0 for piece in PIECES}
+
+
+def from_matrix(chessboard_matrix):
+	'''
+	Args:
+		chessboard_matrix (list): 8 rows of 8 characters, '*' for empty squares
+	Returns:
+		position (dict): piece character -> bitboard
+	'''
+	position = empty_position()
+	for row, line in enumerate(chessboard_matrix):
+		for column, piece in enumerate(line):
+			if piece in position:
+				position[piece] |= 1 << square_index(row, column)
+
+	return position
+
+
+def from_fen(fen):
+	'''
+	Parses the piece placement field of a FEN string, other fields are ignored.
+
+	Args:
+		fen (str): FEN string, for example '1Q5k/8/6K1/8/8/8/8/8 b - - 0 1'
+	Returns:
+		position (dict): piece character -> bitboard
+	'''
+	position = empty_position()
+	rows = fen.split()[0].split('/')
+	if len(rows) != 8:
+		raise ValueError('FEN must describe 8 rows: ' + fen)
+	for row, line in enumerate(rows):
+		column = 0
+		for piece in line:
+			if piece.isdigit():
+				column += int(piece)
+			elif piece in position:
+				position[piece] |= 1 << square_index(row, column)
+				column += 1
+			else:
+				raise ValueError('Unknown piece ' + piece + ' in FEN: ' + fen)
+		if column != 8:
+			raise ValueError('FEN row ' + line + ' does not have 8 squares')
+
+	return position
+
+
+def to_matrix(position):
+	'''
+	Returns:
+		chessboard_matrix (list): 8 rows of 8 characters, '*' for empty squares
+	'''
+	squares = ['*'] * 64
+	for piece, bitboard in position.items():
+		for square in iterate_bits(bitboard):
+			squares[square] = piece
+
+	return [''.join(squares[row * 8 : row * 8 + 8]) for row in range(8)]
+
+
+def occupancy(position, white):
+	pieces = WHITE_PIECES if white else BLACK_PIECES
+	occupied = 0
+	for piece in pieces:
+		occupied |= position[piece]
+
+	return occupied
+
+
+def attackers_of(position, square, by_white, occupied):
+	'''
+	Args:
+		position (dict): piece character -> bitboard
+		square (int): attacked square
+		by_white (bool): True for attacks of white pieces, False for black pieces
+		occupied (int): bitboard of all pieces which block sliding pieces
+	Returns:
+		attackers (int): bitboard of all pieces of the given color attacking the square
+	'''
+	if by_white:
+		king, queen, rook, bishop, knight, pawn = WHITE_PIECES
+	else:
+		king, queen, rook, bishop, knight, pawn = BLACK_PIECES
+	# A white pawn attacks the square if a black pawn on the square would attack the white pawn
+	attackers = position[pawn] & PAWN_ATTACKS[not by_white][square]
+	attackers |= position[knight] & KNIGHT_ATTACKS[square]
+	attackers |= position[king] & KING_ATTACKS[square]
+	straight = position[rook] | position[queen]
+	if straight:
+		attackers |= straight & rook_attacks(square, occupied)
+	diagonal = position[bishop] | position[queen]
+	if diagonal:
+		attackers |= diagonal & bishop_attacks(square, occupied)
+
+	return attackers
+
+
+def is_square_attacked(position, square, by_white, occupied = None):
+	if occupied is None:
+		occupied = occupancy(position, True) | occupancy(position, False)
+
+	return attackers_of(position, square, by_white, occupied) != 0
+
+
+def king_square(position, white):
+	'''
+	Returns:
+		square (int): square of the king, or None if the king is not on the board
+	'''
+	king = position['K' if white else 'k']
+	if not king:
+		return None
+
+	return lowest_bit(king)
+
+
+def in_check(position, white, occupied = None):
+	'''
+	Args:
+		position (dict): piece character -> bitboard
+		white (bool): True to check the white king, False for the black king
+	Returns:
+		result (bool): True if the king is attacked, None if there is no such king
+	'''
+	square = king_square(position, white)
+	if square is None:
+		return None
+
+	return is_square_attacked(position, square, not white, occupied)
+
+
+def get_checking_player(position):
+	'''
+	Returns:
+		player (str): 'W' if white gives check, 'B' if black gives check, '-' if nobody does,
+			or None if a king is missing and the answer is unknown
+	'''
+	occupied = occupancy(position, True) | occupancy(position, False)
+	black_in_check = in_check(position, False, occupied)
+	white_in_check = in_check(position, True, occupied)
+	if black_in_check is None or white_in_check is None:
+		return None
+	if black_in_check:
+		return 'W'
+	if white_in_check:
+		return 'B'
+
+	return '-'
+
+
+# -----------------------------------------------
+# LEGAL MOVE GENERATION
+# Moves are tuples (piece, from_square, to_square, promotion), promotion is None unless a pawn
+# reaches the last row. There is no castling and no en passant in the task, so neither is generated.
+
+PROMOTIONS = {True : 'QRBN', False : 'qrbn'}
+# Pawns of each color start on this row and promote on the last one
+PAWN_START_ROW = {True : 6, False : 1}
+PAWN_LAST_ROW = {True : 0, False : 7}
+
+
+def generate_pseudo_moves(position, white, occupied = None):
+	'''
+	Yields all moves of one side which follow the movement rules of the pieces, including moves
+	which leave the own king in check. King moves come first since they most often answer a check.
+	'''
+	own = occupancy(position, white)
+	opponent = occupancy(position, not white)
+	if occupied is None:
+		occupied = own | opponent
+	king, queen, rook, bishop, knight, pawn = WHITE_PIECES if white else BLACK_PIECES
+
+	for square in iterate_bits(position[king]):
+		for target in iterate_bits(KING_ATTACKS[square] & ~own):
+			yield king, square, target, None
+
+	for square in iterate_bits(position[knight]):
+		for target in iterate_bits(KNIGHT_ATTACKS[square] & ~own):
+			yield knight, square, target, None
+
+	for piece, attacks in [(queen, None), (rook, rook_attacks), (bishop, bishop_attacks)]:
+		for square in iterate_bits(position[piece]):
+			if attacks is None:
+				targets = rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+			else:
+				targets = attacks(square, occupied)
+			for target in iterate_bits(targets & ~own):
+				yield piece, square, target, None
+
+	step = -8 if white else 8
+	for square in iterate_bits(position[pawn]):
+		targets = PAWN_ATTACKS[white][square] & opponent
+		forward = square + step
+		if 0 <= forward < 64 and not (occupied >> forward) & 1:
+			targets |= 1 << forward
+			double = forward + step
+			if square // 8 == PAWN_START_ROW[white] and not (occupied >> double) & 1:
+				targets |= 1 << double
+		for target in iterate_bits(targets):
+			if target // 8 == PAWN_LAST_ROW[white]:
+				for promotion in PROMOTIONS[white]:
+					yield pawn, square, target, promotion
+			else:
+				yield pawn, square, target, None
+
+
+def make_move(position, move):
+	'''
+	Returns:
+		new_position (dict): a copy of the position after the move, the original is not changed
+	'''
+	piece, from_square, to_square, promotion = move
+	to_bit = 1 << to_square
+	new_position = position.copy()
+	new_position[piece] ^= 1 << from_square
+	for captured in (BLACK_PIECES if piece.isupper() else WHITE_PIECES):
+		if new_position[captured] & to_bit:
+			new_position[captured] ^= to_bit
+			break
+	new_position[promotion or piece] |= to_bit
+
+	return new_position
+
+
+def generate_legal_moves(position, white):
+	'''
+	Yields all legal moves of one side.
+
+	When the king is in check, only king moves, captures of the checking piece and moves onto the
+	squares between it and the king are considered, and only king moves in a double check.
+	Every remaining move is legal if the king is not attacked afterwards. That is tested without
+	copying the position: the occupancy is updated and a captured piece is masked out of the
+	attackers, which also rejects moves of pinned pieces.
+	'''
+	own_king = 'K' if white else 'k'
+	king = king_square(position, white)
+	occupied = occupancy(position, True) | occupancy(position, False)
+	if king is None:
+		yield from generate_pseudo_moves(position, white, occupied)
+		return
+
+	evasions = FULL_BOARD
+	checkers = attackers_of(position, king, not white, occupied)
+	if checkers:
+		if checkers & (checkers - 1):
+			evasions = 0
+		else:
+			evasions = checkers | BETWEEN[king][lowest_bit(checkers)]
+
+	for move in generate_pseudo_moves(position, white, occupied):
+		piece, from_square, to_square, promotion = move
+		to_bit = 1 << to_square
+		if piece == own_king:
+			square = to_square
+		elif evasions & to_bit:
+			square = king
+		else:
+			continue
+		new_occupied = (occupied & ~(1 << from_square)) | to_bit
+		if not attackers_of(position, square, not white, new_occupied) & ~to_bit:
+			yield move
+
+
+def has_legal_move(position, white):
+	for move in generate_legal_moves(position, white):
+		return True
+
+	return False
+
+
+def get_game_state(position, white):
+	'''
+	Args:
+		position (dict): piece character -> bitboard
+		white (bool): the side to move
+	Returns:
+		state (str): 'check_mate', 'stalemate', 'check' or 'normal' from the point of view of the
+			side to move, None if its king is not on the board
+	'''
+	checked = in_check(position, white)
+	if checked is None:
+		return None
+	if has_legal_move(position, white):
+		return 'check' if checked else 'normal'
+
+	return 'check_mate' if checked else 'stalemate'
+
+
+def evaluate(position):
+	'''
+	Finds the player giving the check and whether it is a check mate, the same way
+	evaluate_position in checkmate.py reports it.
+
+	Returns:
+		player (str): 'W', 'B', '-' or None if a king is missing
+		check_mate (str): 'check_mate' or 'not_check_mate' if there is a check, None otherwise
+	'''
+	player = get_checking_player(position)
+	if player == 'W' or player == 'B':
+		# The side in check is the side to move
+		if has_legal_move(position, player == 'B'):
+			return player, 'not_check_mate'
+		return player, 'check_mate'
+
+	return player, None
+
+
+def perft(position, white, depth):
+	'''
+	Counts leaf nodes of the legal move tree, the standard way to validate move generators.
+	'''
+	if depth == 0:
+		return 1
+	nodes = 0
+	for move in generate_legal_moves(position, white):
+		if depth == 1:
+			nodes += 1
+		else:
+			nodes += perft(make_move(position, move), not white, depth - 1)
+
+	return nodes
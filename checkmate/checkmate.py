@@ -1,610 +1,1305 @@
-import numpy as np 
-from PIL import Image
-import os 
-
-
-def load_images(path):
-
-	tiles = {
-		'black' : None,
-		'white' : None
-	}
-
-	black_pieces = {
-		'b' : None,
-		'k' : None,
-		'n' : None,
-		'p' : None,
-		'q' : None,
-		'r' : None
-	}
-
-	white_pieces = {
-		'B' : None,
-		'K' : None,
-		'N' : None,
-		'P' : None,
-		'Q' : None,
-		'R' : None
-	}
-
-	for file in os.listdir(os.path.join(path + r'\pieces' + r'\black')):
-		if file.lower().startswith('knight'):
-			black_pieces['n'] = Image.open(path + r'\pieces' + r'\black' + '\\' + file).convert('LA')
-		else: 
-			black_pieces[file[0]] = Image.open(path + r'\pieces' + r'\black' + '\\' + file).convert('LA')
-
-	for file in os.listdir(os.path.join(path + r'\pieces' + r'\white')):
-		if file.lower().startswith('knight'):
-			white_pieces['N'] = Image.open(path + r'\pieces' + r'\white' + '\\' + file).convert('LA')
-		else:
-			white_pieces[file[0].upper()] = Image.open(path + r'\pieces' + r'\white' + '\\' + file).convert('LA')
-	for file in os.listdir(os.path.join(path + r'\tiles')):
-		tiles[file[:-4].lower()] = Image.open(path + r'\tiles' + '\\' + file).convert('LA')
-
-	return tiles, white_pieces, black_pieces
-
-
-def merge_images(tile, piece):
-
-	combined = tile.copy()
-	combined.paste(
-		piece,
-		mask = piece.split()[1]
-		)
-
-	return combined
-
-
-def combine_images(tiles, white_pieces, black_pieces):
-
-	combined_dictionary = {}
-	for tile in tiles:
-		for piece in white_pieces:
-			combined_dictionary[tile + '_' + 'w' + '_' + piece] = merge_images(tiles[tile], white_pieces[piece])
-
-	for tile in tiles:
-		for piece in black_pieces:
-			combined_dictionary[tile + '_' + 'b' + '_' + piece] = merge_images(tiles[tile], black_pieces[piece])
-
-	return combined_dictionary
-
-
-
-def get_tile_size(chessboard, first_x, first_y):
-
-	i_color = chessboard[first_x, first_y]
-	tile_size = 0
-	for i in range(first_x, np.shape(chessboard)[0]):
-		if np.all(chessboard[i, first_y] != i_color):
-			break
-		else:
-			tile_size += 1
-
-	return tile_size
-
-
-
-def extract_chessboard(chessboard, first_x, first_y, tile_size):
-
-	chessboard = chessboard[first_x : first_x + (tile_size * 8), first_y : first_y + (tile_size * 8)]
-	
-	return chessboard
-
-
-def rescale_images(tile_size, images):
-	for image in images:
-		images[image] = np.array(images[image].resize((tile_size, tile_size), resample = Image.BILINEAR))
-
-	return images
-
-
-def get_tile_colors(black_tile, white_tile):
-	black_tile_color = black_tile[0, 0]
-	white_tile_color = white_tile[0, 0]
-
-	return black_tile_color, white_tile_color
-
-
-def get_fen(chessboard, rescaled_images, tile_size, black_tile_color, white_tile_color):
-	chessboard_matrix = ''
-	empty_tiles = 0
-	fen_notation = ''
-	row_index = 0
-	for row in range(8):
-		column_index = 0
-		for column in range(8):
-			tile = chessboard[0+row_index : tile_size+row_index, 0+column_index : tile_size+column_index]
-			if np.all(tile == black_tile_color) or np.all(tile == white_tile_color):
-				empty_tiles += 1
-				chessboard_matrix += '*'
-			else:
-				if empty_tiles > 0:
-					fen_notation += str(empty_tiles)
-					empty_tiles = 0
-				flattened_tile = np.ndarray.flatten(tile)
-				corr_score = 0
-				chess_piece = ''
-				for image in rescaled_images:
-					flattened_image = np.ndarray.flatten(rescaled_images[image])
-					corr_coef = np.corrcoef(flattened_tile, flattened_image)[0, 1]
-					if corr_coef > corr_score:
-						corr_score = corr_coef 
-						chess_piece = image 
-					else:
-						continue
-				chessboard_matrix += chess_piece[-1]
-				fen_notation += chess_piece[-1]
-			column_index += tile_size
-
-		if empty_tiles > 0:
-			fen_notation += str(empty_tiles)
-			empty_tiles = 0
-
-		row_index += tile_size
-		fen_notation += '/'
-		chessboard_matrix += '/'
-
-	return fen_notation[:-1], chessboard_matrix[:-1]
-
-
-
-def get_xy(chessboard):
-	indices = np.where(
-		np.all(
-			chessboard != (0, 0, 0), 
-			axis = -1
-			)
-		)
-	x_axis = indices[0][0]
-	y_axis = indices[1][0]
-
-	return x_axis, y_axis 
-
-
-
-# -----------------------------------------------
-# FUNCTIONS FOR CHECKING WHETHER THE CURRENT POSITION REPRESENTS A CHECK
-# Whoever is reading this: I am sorry for the ugly code I've written down here
-# but it works and I didn't have much time to come up with some more beautiful algorithm :)
-
-def check(chessboard, king_color):
-
-	if king_color == 'k':
-		opposing_pieces = {
-			'bishop' : 'B',
-			'king' : 'K',
-			'knight' : 'N',
-			'queen' : 'Q',
-			'rook' : 'R', 
-			'pawn' : 'P'
-		}
-	elif king_color == 'K':
-		opposing_pieces = {
-			'bishop' : 'b',
-			'king' : 'k',
-			'knight' : 'n',
-			'queen' : 'q',
-			'rook' : 'r', 
-			'pawn' : 'p'
-			}
-
-	king_x = 0
-	king_y = 0
-
-	for index, row in enumerate(chessboard):
-		if king_color in row:
-			king_y = row.index(king_color)
-			break
-		else:
-			king_x += 1
-
-	result = None
-	lookup_functions = [leftright_diagonal_lookup, rightleft_diagonal_lookup, vertical_lookup, horizontal_lookup, knight_lookup]
-	
-	for i in range(5):
-		result = lookup_functions[i](chessboard, king_color, king_x, king_y, opposing_pieces)
-		if result == 'chess':
-			return 'chess'
-
-	return None
-
-
-def vertical_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
-	for i in range(king_x, 8):
-		piece = chessboard[i][king_y]
-		if piece == '*' or piece == king_color:
-			continue
-		elif piece not in opposing_pieces.values():
-			break
-		elif piece in opposing_pieces.values():
-			if np.abs(king_x - i) == 1:
-				if piece in [opposing_pieces['king'],opposing_pieces['queen'],opposing_pieces['rook']]:
-					return 'chess'
-				else:
-					break
-			else:
-				if piece in [opposing_pieces['queen'], opposing_pieces['rook']]:
-					return 'chess'
-				else:
-					break
-
-	for i in reversed(range(king_x)):
-		piece = chessboard[i][king_y]
-		if piece == '*' or piece == king_color:
-			continue
-		elif piece not in opposing_pieces.values():
-			break
-		elif piece in opposing_pieces.values():
-			if np.abs(king_x - i) == 1:
-				if piece in [opposing_pieces['king'],opposing_pieces['queen'],opposing_pieces['rook']]:
-					return 'chess'
-				else:
-					break
-			else:
-				if piece in [opposing_pieces['queen'], opposing_pieces['rook']]:
-					return 'chess'
-				else:
-					break
-
-	return None
-
-
-def horizontal_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
-	for i in range(king_y, 8):
-		piece = chessboard[king_x][i]
-		if piece == '*' or piece == king_color:
-			continue
-		elif piece not in opposing_pieces.values():
-			break
-		elif piece in opposing_pieces.values():
-			if np.abs(king_y - i) == 1:
-				if piece in [opposing_pieces['king'],opposing_pieces['queen'],opposing_pieces['rook']]:
-					return 'chess'
-				else:
-					break
-			else:
-				if piece in [opposing_pieces['queen'], opposing_pieces['rook']]:
-					return 'chess'
-				else:
-					break
-
-	for i in reversed(range(king_y)):
-		piece = chessboard[king_x][i]
-		if piece == '*' or piece == king_color:
-			continue
-		elif piece not in opposing_pieces.values():
-			break
-		elif piece in opposing_pieces.values():
-			if np.abs(king_y - i) == 1:
-				if piece in [opposing_pieces['king'], opposing_pieces['queen'],opposing_pieces['rook']]:
-					return 'chess'
-				else:
-					break 
-			else:
-				if piece in [opposing_pieces['queen'], opposing_pieces['rook']]:
-					return 'chess'
-				else:
-					break
-
-	return None
-
-
-def knight_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
-	possible_indices = zip(
-			[
-				king_x - 1, king_x - 1, king_x - 2, king_x - 2,
-				king_x + 1, king_x + 1, king_x + 2, king_x + 2 
-			],
-			[
-				king_y - 2, king_y + 2, king_y - 1, king_y + 1,
-				king_y - 2, king_y + 2, king_y - 1, king_y + 1
-			]
-		)
-
-	for idx_comb in possible_indices:
-		try:
-			if opposing_pieces['knight'] == chessboard[idx_comb[0]][idx_comb[1]]:
-				return 'chess'
-			else:
-				continue
-		except IndexError:
-			continue
-
-	return None
-
-
-def leftright_diagonal_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
-	x = king_x
-	y = king_y
-	for i in range(king_x, 8):
-		if (x > 7 or y > 7) or (x < 0 or y < 0):
-			break 
-		piece = chessboard[x][y]
-		if piece == '*' or piece == king_color:
-			x += 1
-			y += 1
-			continue 
-		elif piece not in opposing_pieces.values():
-			break
-		elif piece in opposing_pieces.values():
-			if king_color == 'k':
-				if (x - king_x == 1) and (y - king_y == 1):
-					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
-						return 'chess'
-					else:
-						break
-				else:
-					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
-						return 'chess'
-			elif king_color == 'K':
-				if (king_x - 1 == 1) and (king_y - 1 == 1):
-					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
-						return 'chess'
-					else:
-						break
-				else:
-					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
-						return 'chess'
-	x = king_x 
-	y = king_y
-
-	for i in reversed(range(king_x)):
-		if (x > 7 or y > 7) or (x < 0 or y < 0):
-			break 
-		piece = chessboard[x][y]
-		if piece == '*' or piece == king_color:
-			x -= 1
-			y -= 1
-			continue 
-		elif piece not in opposing_pieces.values():
-			break
-		elif piece in opposing_pieces.values():
-			if king_color == 'k':
-				if (x - king_x == 1) and (y - king_y == 1):
-					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
-						return 'chess'
-					else:
-						break
-				else:
-					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
-						return 'chess'
-			elif king_color == 'K':
-				if (king_x - x == 1) and (king_y - y == 1):
-					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
-						return 'chess'
-					else:
-						break
-				else:
-					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
-						return 'chess'
-
-
-	return None 
-
-
-def rightleft_diagonal_lookup(chessboard, king_color, king_x, king_y, opposing_pieces):
-	x = king_x
-	y = king_y
-
-	for i in range(king_x, 8):
-		if (x > 7 or y > 7) or (x < 0 or y < 0):
-			break 
-		piece = chessboard[x][y]
-		if piece == '*' or piece == king_color:
-			x += 1
-			y -= 1
-			continue 
-		elif piece not in opposing_pieces.values():
-			break
-		elif piece in opposing_pieces.values():
-			if king_color == 'k':
-				if (x - king_x == 1) and (y - king_y == -1):
-					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
-						return 'chess'
-					else:
-						break
-				else:
-					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
-						return 'chess'
-			elif king_color == 'K':
-				if (king_x - x == 1) and (y - king_y == 1):
-					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
-						return 'chess'
-					else:
-						break
-				else:
-					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
-						return 'chess'
-	x = king_x 
-	y = king_y
-
-	for i in reversed(range(king_x)):
-		if (x > 7 or y > 7) or (x < 0 or y < 0):
-			break 
-		piece = chessboard[x][y]
-		if piece == '*' or piece == king_color:
-			x -= 1
-			y += 1
-			continue 
-		elif piece not in opposing_pieces.values():
-			break
-		elif piece in opposing_pieces.values():
-			if king_color == 'k':
-				if (x - king_x == 1) and (y - king_y == -1):
-					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
-						return 'chess'
-					else:
-						break
-				else:
-					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
-						return 'chess'
-			elif king_color == 'K':
-				if (king_x - x == 1) and (y - king_y == 1):
-					if piece in [opposing_pieces['pawn'], opposing_pieces['queen'], opposing_pieces['bishop'], opposing_pieces['king']]:
-						return 'chess'
-					else:
-						break
-				else:
-					if piece in [opposing_pieces['queen'], opposing_pieces['bishop']]:
-						return 'chess'
-
-	return None 
-
-
-def move_king(chessboard, king_color):
-	# OVO NIJE DOBRO, AKO NE SREDIS DO SUTRA ONDA BRISI
-	if king_color == 'k':
-		opposing_pieces = {
-			'bishop' : 'B',
-			'king' : 'K',
-			'knight' : 'N',
-			'queen' : 'Q',
-			'rook' : 'R', 
-			'pawn' : 'P'
-		}
-	elif king_color == 'K':
-		opposing_pieces = {
-			'bishop' : 'b',
-			'king' : 'k',
-			'knight' : 'n',
-			'queen' : 'q',
-			'rook' : 'r', 
-			'pawn' : 'p'
-			}
-
-	king_x = 0
-	king_y = 0
-
-	for index, row in enumerate(chessboard):
-		if king_color in row:
-			king_y = row.index(king_color)
-			break
-		else:
-			king_x += 1
-
-	new_chessboard = chessboard.copy()
-	movements = [
-		(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)
-		]
-	for movement in movements:
-		x = king_x + movement[0]
-		y = king_y + movement[1]
-		if x < 0 or y < 0:
-			continue
-		try:
-			tile = new_chessboard[x][y]
-			if tile == '*' or tile in opposing_pieces.values():
-				new_chessboard[x] = new_chessboard[x][:y] + king_color + new_chessboard[x][y + 1:]
-				new_chessboard[king_x] = new_chessboard[king_x][:king_y] + '*' + new_chessboard[king_x][king_y + 1:]
-				result = check(new_chessboard, king_color)
-				if result:
-					new_chessboard = chessboard.copy()
-					continue
-				elif not result:
-					return 'not_check_mate'
-			else:
-				continue
-		except IndexError:
-			continue
-
-	return 'check_mate'
-
-
-# --------------------------
-# RUNNING A PROGRAM
-def run_program(path):
-	# ----------------------------------------- 
-	# Getting all information on chessboard image
-	for file in os.listdir(path):
-		if file.endswith('.png'):
-			filename = os.path.join(path, file)
-			chess_image = Image.open(filename)
-	x_axis, y_axis = get_xy(np.array(chess_image))
-	tile_size = get_tile_size(
-		chessboard = np.array(chess_image), 
-		first_x = x_axis, 
-		first_y = y_axis
-		)
-	chessboard = extract_chessboard(
-		chessboard = np.array(chess_image.convert('LA')), 
-		first_x = x_axis, 
-		first_y = y_axis, 
-		tile_size = tile_size
-		)
-	# -------------------------------------------
-
-	tiles, white_pieces, black_pieces = load_images(path)
-	final_images = combine_images(tiles, white_pieces, black_pieces)
-	final_images = rescale_images(tile_size, final_images)
-	black_tile_color, white_tile_color = get_tile_colors(np.array(tiles['black']), np.array(tiles['white']))
-
-	# -------------------------------------------
-	fen, chessboard_matrix = get_fen(
-		chessboard, 
-		final_images,
-		tile_size,
-		black_tile_color,
-		white_tile_color
-		)
-	# -------------------------------------------
-	# Razmisli kako ovo da sredis :) 
-	chessboard_matrix = chessboard_matrix.split('/')
-	player = '-'
-	try:
-		if check(chessboard_matrix, 'k') == 'chess':
-			player = 'W'
-		else:
-			if check(chessboard_matrix, 'K') == 'chess':
-				player = 'B'
-	except:
-		player = None
-
-	check_mate = None
-	if player:
-		if player == 'W':
-			n_of_pieces = 0
-			for row in chessboard_matrix:
-				for ch in row:
-					if ch.islower():
-						n_of_pieces += 1
-			try:
-				check_mate = move_king(chessboard_matrix, 'k')
-				if n_of_pieces > 1 and check_mate == 'check_mate':
-					check_mate = None
-			except:
-				check_mate = None 
-		elif player == 'B':
-			n_of_pieces = 0
-			for row in chessboard_matrix:
-				for ch in row:
-					if ch.isupper():
-						n_of_pieces += 1
-			try:
-				check_mate = move_king(chessboard_matrix, 'K')
-				if n_of_pieces > 1 and check_mate == 'check_mate':
-					check_mate = None
-			except:
-				check_mate = None
-			
-
-	return x_axis, y_axis, fen, player, check_mate
-
-
-if __name__ == "__main__":
-	path = input()
-	results = run_program(path)
-	print(str(results[0]) + ',' + str(results[1]))
-	print(results[2])
-	if results[3]:
-		print(results[3])
-	else:
-		print()
-	if results[3] == '-':
-		print(0)
-	elif results[4] == 'not_check_mate':
-		print(0)
-	elif results[4] == 'check_mate':
-		print(1)
-	else:
-		print()
\ No newline at end of file
+import numpy as np 
+from PIL import Image
+import os 
+import sys
+import csv
+import json
+import argparse
+import multiprocessing
+import hashlib
+import time
+import io
+import multiprocessing.util
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+from bitboard import from_matrix, evaluate, zobrist_hash
+
+
+SPRITE_NAMES = ['black_' + piece for piece in 'kqrbnp'] + ['white_' + piece for piece in 'KQRBNP'] + ['tiles_black', 'tiles_white']
+
+
+def get_sprite_files(path):
+	'''
+	Finds all sprites in the pieces/black, pieces/white and tiles folders and names them
+	the way the rest of the program uses them.
+
+	Args:
+		path (str): folder with pieces and tiles subfolders
+	Returns:
+		files (dict): sprite name -> pathlib.Path, names are 'tiles_black', 'tiles_white',
+			'black_<piece>' and 'white_<PIECE>' where piece is the FEN character
+	Raises:
+		FileNotFoundError: if a folder or one of the SPRITE_NAMES sprites is missing
+		ValueError: if there are sprites other than SPRITE_NAMES
+	'''
+	path = Path(path)
+	folders = {'black' : path / 'pieces' / 'black', 'white' : path / 'pieces' / 'white', 'tiles' : path / 'tiles'}
+	for folder in folders.values():
+		if not folder.is_dir():
+			raise FileNotFoundError('Sprite folder {} does not exist'.format(folder))
+
+	files = {}
+	for color in ['black', 'white']:
+		for file in sorted(folders[color].glob('*.png')):
+			piece = 'n' if file.name.lower().startswith('knight') else file.name[0].lower()
+			name = color + '_' + (piece.upper() if color == 'white' else piece)
+			if name in files:
+				raise ValueError('Both {} and {} are the same sprite'.format(files[name], file))
+			files[name] = file
+	for file in sorted(folders['tiles'].glob('*.png')):
+		files['tiles_' + file.stem.lower()] = file
+
+	missing = [name for name in SPRITE_NAMES if name not in files]
+	if missing:
+		raise FileNotFoundError('Sprites {} are missing in {}'.format(', '.join(missing), path))
+	unexpected = sorted(str(files[name]) for name in files if name not in SPRITE_NAMES)
+	if unexpected:
+		raise ValueError('Unexpected sprites {}'.format(', '.join(unexpected)))
+
+	return files
+
+
+def save_arrays(directory, arrays):
+	'''
+	Saves every array as <name>.npy. Files are written to a temporary name first and then
+	renamed, so that parallel workers never read half-written arrays.
+	'''
+	directory = Path(directory)
+	directory.mkdir(parents = True, exist_ok = True)
+	for name, array in arrays.items():
+		temporary = directory / '{}.{}.tmp.npy'.format(name, os.getpid())
+		np.save(temporary, array)
+		os.replace(temporary, directory / (name + '.npy'))
+
+
+def load_arrays(directory, names):
+	'''
+	Memory-maps <name>.npy files read-only, so that all worker processes share one copy of the
+	data through the page cache.
+
+	Raises:
+		OSError, ValueError: if any of the files is missing or broken
+	'''
+	directory = Path(directory)
+
+	return {name : np.load(directory / (name + '.npy'), mmap_mode = 'r') for name in names}
+
+
+def load_sprite_arrays(path, cache_dir = None):
+	'''
+	Decodes all sprites to LA NumPy arrays once per process, path and cache_dir. With cache_dir
+	the decoded arrays are also saved as .npy files, and later processes memory-map them instead
+	of decoding PNGs.
+
+	Args:
+		path (str): folder with pieces and tiles subfolders
+		cache_dir (str): optional folder where decoded sprites are persisted
+	Returns:
+		sprites (dict): sprite name (see get_sprite_files) -> read-only NumPy array
+	'''
+	key = (str(Path(path).resolve()), str(Path(cache_dir).resolve()) if cache_dir else None)
+	sprites = cache_get(_sprite_cache, key, 'sprite')
+	if sprites is not None:
+		return sprites
+
+	files = get_sprite_files(path)
+	if cache_dir:
+		sprite_dir = Path(cache_dir) / assets_fingerprint(path) / 'sprites'
+		try:
+			sprites = load_arrays(sprite_dir, files)
+		except (OSError, ValueError):
+			save_arrays(sprite_dir, {name : np.array(Image.open(file).convert('LA')) for name, file in files.items()})
+			sprites = load_arrays(sprite_dir, files)
+	if sprites is None:
+		sprites = {}
+		for name, file in files.items():
+			sprites[name] = np.array(Image.open(file).convert('LA'))
+			sprites[name].setflags(write = False)
+
+	cache_put(_sprite_cache, key, sprites, SPRITE_CACHE_SIZE)
+
+	return sprites
+
+
+def load_images(path, cache_dir = None):
+	'''
+	Args:
+		path (str): folder with pieces and tiles subfolders
+		cache_dir (str): optional folder where decoded sprites are persisted
+	Returns:
+		tiles (dict): 'black' and 'white' tiles as LA images
+		white_pieces (dict): FEN character -> LA image of the white piece
+		black_pieces (dict): FEN character -> LA image of the black piece
+	'''
+	tiles = {}
+	black_pieces = {}
+	white_pieces = {}
+	groups = {'tiles' : tiles, 'black' : black_pieces, 'white' : white_pieces}
+	for name, array in load_sprite_arrays(path, cache_dir).items():
+		group, key = name.split('_', 1)
+		groups[group][key] = Image.fromarray(np.asarray(array))
+
+	return tiles, white_pieces, black_pieces
+
+
+def merge_images(tile, piece):
+
+	combined = tile.copy()
+	combined.paste(
+		piece,
+		mask = piece.split()[1]
+		)
+
+	return combined
+
+
+def combine_images(tiles, white_pieces, black_pieces):
+
+	combined_dictionary = {}
+	for tile in tiles:
+		for piece in white_pieces:
+			combined_dictionary[tile + '_' + 'w' + '_' + piece] = merge_images(tiles[tile], white_pieces[piece])
+
+	for tile in tiles:
+		for piece in black_pieces:
+			combined_dictionary[tile + '_' + 'b' + '_' + piece] = merge_images(tiles[tile], black_pieces[piece])
+
+	return combined_dictionary
+
+
+
+def get_tile_size(chessboard, first_x, first_y, tolerance = 0):
+	'''
+	Measures the run of pixels below the top left pixel of the chessboard that still share a
+	channel value with it (within tolerance). The run ends at the first pixel which differs in
+	every channel by more than tolerance, which is where the first tile ends.
+	'''
+	column = chessboard[first_x:, first_y]
+	if tolerance == 0:
+		edges = np.all(column != chessboard[first_x, first_y], axis = -1)
+	else:
+		difference = np.abs(column.astype(np.int16) - chessboard[first_x, first_y])
+		edges = np.all(difference > tolerance, axis = -1)
+	if not edges.any():
+		return column.shape[0]
+
+	return int(np.argmax(edges))
+
+
+
+def extract_chessboard(chessboard, first_x, first_y, tile_size):
+
+	chessboard = chessboard[first_x : first_x + (tile_size * 8), first_y : first_y + (tile_size * 8)]
+	
+	return chessboard
+
+
+def rescale_images(tile_size, images):
+	for image in images:
+		images[image] = np.array(images[image].resize((tile_size, tile_size), resample = Image.BILINEAR))
+
+	return images
+
+
+def get_tile_colors(black_tile, white_tile):
+	black_tile_color = black_tile[0, 0]
+	white_tile_color = white_tile[0, 0]
+
+	return black_tile_color, white_tile_color
+
+
+def normalize_rows(matrix):
+	'''
+	Mean-centers and L2-normalizes every row of a matrix, so that the dot product of two
+	normalized rows equals the Pearson correlation coefficient of the original rows.
+	Constant rows (zero norm) are left as zeros and correlate 0 with everything.
+
+	Args:
+		matrix (np.array): NumPy array with shape (M, D)
+	Returns:
+		normalized (np.array): NumPy float64 array with shape (M, D)
+	'''
+	normalized = matrix.astype(np.float64)
+	normalized -= normalized.mean(axis = 1, keepdims = True)
+	norms = np.linalg.norm(normalized, axis = 1, keepdims = True)
+	norms[norms == 0] = 1
+	normalized /= norms
+
+	return normalized
+
+
+def prepare_templates(rescaled_images):
+	'''
+	Flattens all rescaled combined images into a single template matrix, once per board.
+
+	Args:
+		rescaled_images (dict): combined images as returned by rescale_images
+	Returns:
+		labels (np.array): FEN character of every template with shape (M,)
+		templates (np.array): mean-centered, L2-normalized templates with shape (M, D)
+	'''
+	labels = np.array([image[-1] for image in rescaled_images])
+	templates = np.stack([np.ravel(rescaled_images[image]) for image in rescaled_images])
+
+	return labels, normalize_rows(templates)
+
+
+def extract_tiles(chessboard, tile_size):
+	'''
+	Splits the extracted chessboard into its 64 tiles without a Python loop.
+	Tiles are ordered row by row starting from a8, the same order as in FEN.
+
+	Args:
+		chessboard (np.array): NumPy array of the chessboard with shape (8 * tile_size, 8 * tile_size, channels)
+		tile_size (int): size of one tile in pixels
+	Returns:
+		tiles (np.array): NumPy array with shape (64, tile_size * tile_size * channels)
+	'''
+	channels = chessboard.shape[2]
+	tiles = chessboard.reshape(8, tile_size, 8, tile_size, channels).swapaxes(1, 2)
+
+	return tiles.reshape(64, tile_size * tile_size * channels)
+
+
+# Unsigned integer types which hold one whole pixel with 1, 2 or 4 uint8 channels
+PACKED_TYPES = {1 : np.uint8, 2 : np.uint16, 4 : np.uint32}
+
+
+def pack_pixels(pixels, channels):
+	'''
+	Views every pixel of uint8 data as a single unsigned integer, so that a whole pixel is
+	compared with one operation instead of one per channel.
+
+	Args:
+		pixels (np.array): uint8 NumPy array with shape (n, pixels * channels)
+		channels (int): number of channels, one of PACKED_TYPES
+	Returns:
+		packed (np.array): NumPy array with shape (n, pixels)
+	'''
+	return np.ascontiguousarray(pixels, dtype = np.uint8).view(PACKED_TYPES[channels])
+
+
+def get_tile_statistics(tiles, channels):
+	'''
+	Computes per-tile statistics for all tiles in one vectorized pass.
+
+	Args:
+		tiles (np.array): NumPy array with shape (n, tile_size * tile_size * channels)
+		channels (int): number of channels of a tile
+	Returns:
+		minimum (np.array): per-channel minimum with shape (n, channels)
+		maximum (np.array): per-channel maximum with shape (n, channels)
+		mean (np.array): per-channel mean with shape (n, channels)
+		variance (np.array): per-channel variance with shape (n, channels)
+	'''
+	# Channels first, so that every reduction runs over contiguous memory
+	pixels = np.ascontiguousarray(tiles.reshape(tiles.shape[0], -1, channels).transpose(0, 2, 1))
+	values = pixels.astype(np.float64)
+
+	return pixels.min(axis = 2), pixels.max(axis = 2), values.mean(axis = 2), values.var(axis = 2)
+
+
+def get_empty_tiles(tiles, black_tile_color, white_tile_color, tolerance = 0):
+	'''
+	A tile is empty if every pixel is within tolerance of one of the tile colors. With a positive
+	tolerance a tile also counts as empty if its mean is within tolerance of a tile color and its
+	standard deviation is at most half the tolerance, which ignores sparse compression artifacts.
+
+	With tolerance 0 this is exactly np.all(tile == tile_color): pixels are packed into single
+	integers, and a tile is empty if its smallest and largest packed pixel are both a tile color.
+
+	Returns:
+		empty (np.array): boolean NumPy array with shape (n,)
+	'''
+	channels = np.size(black_tile_color)
+	if tolerance == 0 and channels in PACKED_TYPES:
+		packed = pack_pixels(tiles, channels)
+		colors = pack_pixels(np.stack([black_tile_color, white_tile_color]), channels).ravel()
+		lowest = packed.min(axis = 1, initial = np.iinfo(packed.dtype).max)
+		highest = packed.max(axis = 1, initial = 0)
+		return (lowest == highest) & np.isin(lowest, colors)
+
+	minimum, maximum, mean, variance = get_tile_statistics(tiles, channels)
+	empty = np.zeros(tiles.shape[0], dtype = bool)
+	for color in [black_tile_color, white_tile_color]:
+		color = np.asarray(color, dtype = np.float64)
+		empty |= np.all((minimum >= color - tolerance) & (maximum <= color + tolerance), axis = 1)
+		if tolerance > 0:
+			close = np.abs(mean - color) <= tolerance
+			flat = variance <= (tolerance / 2) ** 2
+			empty |= np.all(close & flat, axis = 1)
+
+	return empty
+
+
+def match_tiles(tiles, labels, templates):
+	'''
+	Scores every tile against every template with one matrix multiplication and returns
+	the label of the best correlated template for each tile.
+
+	Args:
+		tiles (np.array): NumPy array with shape (n, D)
+		labels (np.array): FEN character of every template with shape (M,)
+		templates (np.array): normalized templates with shape (M, D)
+	Returns:
+		pieces (np.array): FEN character of every tile with shape (n,)
+	'''
+	if tiles.shape[0] == 0:
+		return np.array([], dtype = labels.dtype)
+	scores = normalize_rows(tiles) @ templates.T
+
+	return labels[np.argmax(scores, axis = 1)]
+
+
+def squares_to_fen(squares):
+	'''
+	Args:
+		squares (np.array): 64 characters in FEN order, '*' for empty squares
+	Returns:
+		fen_notation (str): FEN piece placement
+		chessboard_matrix (str): 8 rows of 8 characters separated by '/'
+	'''
+	rows = [''.join(squares[row * 8 : row * 8 + 8]) for row in range(8)]
+	fen_rows = []
+	for row in rows:
+		fen_row = ''
+		empty_tiles = 0
+		for square in row:
+			if square == '*':
+				empty_tiles += 1
+			else:
+				if empty_tiles > 0:
+					fen_row += str(empty_tiles)
+					empty_tiles = 0
+				fen_row += square
+		if empty_tiles > 0:
+			fen_row += str(empty_tiles)
+		fen_rows.append(fen_row)
+
+	return '/'.join(fen_rows), '/'.join(rows)
+
+
+def get_fen(chessboard, rescaled_images, tile_size, black_tile_color, white_tile_color, templates = None,
+	tolerance = 0):
+	'''
+	Recognizes all pieces on the chessboard. Empty tiles are the ones filled with one of the
+	tile colors (see get_empty_tiles), every other tile gets the piece of the template it
+	correlates with most.
+
+	Args:
+		chessboard (np.array): extracted chessboard in LA mode
+		rescaled_images (dict): combined images as returned by rescale_images
+		tile_size (int): size of one tile in pixels
+		black_tile_color (np.array): LA color of the black tile
+		white_tile_color (np.array): LA color of the white tile
+		templates (tuple): optional (labels, templates) from prepare_templates, so that the same
+			templates can be reused across boards
+		tolerance (float): allowed difference from the tile colors for empty tiles, useful for
+			JPEG-compressed screenshots
+	Returns:
+		fen_notation (str): FEN piece placement
+		chessboard_matrix (str): 8 rows of 8 characters separated by '/', '*' for empty squares
+	'''
+	if templates is None:
+		templates = prepare_templates(rescaled_images)
+	labels, template_matrix = templates
+
+	tiles = extract_tiles(chessboard, tile_size)
+	empty = get_empty_tiles(tiles, black_tile_color, white_tile_color, tolerance)
+
+	squares = np.full(64, '*')
+	squares[~empty] = match_tiles(tiles[~empty], labels, template_matrix)
+
+	return squares_to_fen(squares)
+
+
+# Offsets of up to SEARCH_RADIUS pixels in every direction are searched for every tile
+SEARCH_RADIUS = 2
+
+
+def extract_windows(chessboard, tile_size, radius = SEARCH_RADIUS):
+	'''
+	Cuts a window of tile_size + 2 * radius pixels around every tile from the first channel of
+	the chessboard. The chessboard is padded with its edge pixels, so border tiles also get
+	full windows.
+
+	Args:
+		chessboard (np.array): NumPy array with shape (8 * tile_size, 8 * tile_size, channels)
+		tile_size (int): size of one tile in pixels
+		radius (int): largest searched offset in pixels
+	Returns:
+		windows (np.array): NumPy float64 array with shape (64, tile_size + 2 * radius, tile_size + 2 * radius)
+	'''
+	padded = np.pad(chessboard[..., 0].astype(np.float64), radius, mode = 'edge')
+	size = tile_size + 2 * radius
+	windows = np.lib.stride_tricks.sliding_window_view(padded, (size, size))[::tile_size, ::tile_size]
+
+	return windows[:8, :8].reshape(64, size, size)
+
+
+def box_sums(images, size):
+	'''
+	Sums of all size x size blocks of every image, computed from integral images.
+
+	Args:
+		images (np.array): NumPy array with shape (n, height, width)
+		size (int): size of a block
+	Returns:
+		sums (np.array): NumPy array with shape (n, height - size + 1, width - size + 1)
+	'''
+	integral = np.zeros((images.shape[0], images.shape[1] + 1, images.shape[2] + 1))
+	integral[:, 1:, 1:] = images.cumsum(axis = 1).cumsum(axis = 2)
+
+	return (integral[:, size:, size:] - integral[:, :-size, size:]
+		- integral[:, size:, :-size] + integral[:, :-size, :-size])
+
+
+def get_template_spectra(templates, tile_size, radius = SEARCH_RADIUS):
+	'''
+	Mean-centers and L2-normalizes templates and returns the conjugate of their Fourier
+	transforms, zero-padded to the window size used by ncc_scores.
+
+	Args:
+		templates (np.array): first channel of the templates with shape (M, tile_size, tile_size)
+		tile_size (int): size of one tile in pixels
+		radius (int): largest searched offset in pixels
+	Returns:
+		spectra (np.array): NumPy complex array with shape (M, size, size // 2 + 1), where size is
+			tile_size + 2 * radius
+	'''
+	size = tile_size + 2 * radius
+	normalized = normalize_rows(templates.reshape(templates.shape[0], -1)).reshape(templates.shape)
+
+	return np.conj(np.fft.rfft2(normalized, s = (size, size)))
+
+
+def ncc_scores(windows, spectra, tile_size, radius = SEARCH_RADIUS):
+	'''
+	Normalized cross-correlation of every window with every template at every offset up to
+	radius pixels, computed with FFT. The template side is already normalized in spectra and
+	the window side is normalized per offset with box sums of the window and its square.
+
+	Args:
+		windows (np.array): windows from extract_windows with shape (n, size, size)
+		spectra (np.array): spectra from get_template_spectra with shape (M, size, size // 2 + 1)
+		tile_size (int): size of one tile in pixels
+		radius (int): largest searched offset in pixels
+	Returns:
+		scores (np.array): best correlation over all offsets with shape (n, M)
+	'''
+	size = tile_size + 2 * radius
+	offsets = 2 * radius + 1
+	n_of_pixels = tile_size * tile_size
+	sums = box_sums(windows, tile_size)
+	squares = box_sums(windows * windows, tile_size)
+	deviations = np.sqrt(np.maximum(squares - sums * sums / n_of_pixels, 0))
+	# Flat patches correlate 0 with everything, the same as in normalize_rows
+	flat = deviations < 1e-6
+	deviations[flat] = 1
+
+	window_spectra = np.fft.rfft2(windows)
+	scores = np.empty((windows.shape[0], spectra.shape[0]))
+	# One template at a time keeps the inverse transforms at (n, size, size) floats
+	for index in range(spectra.shape[0]):
+		correlation = np.fft.irfft2(window_spectra * spectra[index], s = (size, size))[:, :offsets, :offsets]
+		correlation = np.where(flat, 0, correlation / deviations)
+		scores[:, index] = correlation.reshape(windows.shape[0], -1).max(axis = 1)
+
+	return scores
+
+
+def get_fen_ncc(chessboard, tile_size, labels, spectra, black_tile_color, white_tile_color,
+	radius = SEARCH_RADIUS, tolerance = 0):
+	'''
+	Recognizes all pieces on a chessboard which was resampled to one of the pyramid levels.
+	Unlike get_fen, every piece may be off the tile grid by up to radius pixels, which absorbs
+	the rounding of non-integer tile sizes. Empty tiles are found on the inner part of every
+	tile, since tile borders are blended with their neighbours after resampling.
+
+	Args:
+		chessboard (np.array): resampled chessboard in LA mode with shape (8 * tile_size, 8 * tile_size, 2)
+		tile_size (int): pyramid level, size of one tile in pixels
+		labels (np.array): FEN character of every template with shape (M,)
+		spectra (np.array): template spectra of this level from get_template_spectra
+		black_tile_color (np.array): LA color of the black tile
+		white_tile_color (np.array): LA color of the white tile
+		radius (int): largest searched offset in pixels
+		tolerance (float): allowed difference from the tile colors for empty tiles
+	Returns:
+		fen_notation (str): FEN piece placement
+		chessboard_matrix (str): 8 rows of 8 characters separated by '/', '*' for empty squares
+	'''
+	channels = chessboard.shape[2]
+	margin = radius + 1
+	tiles = extract_tiles(chessboard, tile_size).reshape(64, tile_size, tile_size, channels)
+	inner = tiles[:, margin : tile_size - margin, margin : tile_size - margin].reshape(64, -1)
+	empty = get_empty_tiles(inner, black_tile_color, white_tile_color, tolerance)
+
+	squares = np.full(64, '*')
+	if not empty.all():
+		windows = extract_windows(chessboard, tile_size, radius)[~empty]
+		squares[~empty] = labels[np.argmax(ncc_scores(windows, spectra, tile_size, radius), axis = 1)]
+
+	return squares_to_fen(squares)
+
+
+
+def get_foreground(chessboard, threshold = 0):
+	'''
+	Args:
+		chessboard (np.array): RGB image with shape (height, width, 3)
+		threshold (float): largest channel value which still counts as black, e.g. for the
+			noise JPEG compression leaves in the black background
+	Returns:
+		mask (np.array): boolean NumPy array which is True for pixels that are not black,
+			i.e. pixels whose every channel is above threshold
+	'''
+	darkest = np.minimum(np.minimum(chessboard[..., 0], chessboard[..., 1]), chessboard[..., 2])
+
+	return darkest > threshold
+
+
+def get_xy(chessboard, mask = None):
+	'''
+	Finds the first non-black pixel in row-major order, the top left pixel of the chessboard.
+	Uses a row projection of the foreground mask instead of materializing all of its indices.
+	'''
+	if mask is None:
+		mask = get_foreground(chessboard)
+	rows = mask.any(axis = 1)
+	if not rows.any():
+		raise ValueError('There is no chessboard on the image')
+	x_axis = int(np.argmax(rows))
+	y_axis = int(np.argmax(mask[x_axis]))
+
+	return x_axis, y_axis 
+
+
+def get_bounding_box(mask):
+	'''
+	Returns:
+		top, bottom, left, right (int): bounding box of the foreground, bottom and right exclusive
+	'''
+	rows = mask.any(axis = 1)
+	columns = mask.any(axis = 0)
+	top = int(np.argmax(rows))
+	bottom = rows.size - int(np.argmax(rows[::-1]))
+	left = int(np.argmax(columns))
+	right = columns.size - int(np.argmax(columns[::-1]))
+
+	return top, bottom, left, right
+
+
+def find_corner(chess_image, tolerance = 0):
+	'''
+	Converts the image to a NumPy array once and finds the top left pixel of the chessboard
+	and the bounding box of everything that is not black.
+
+	Args:
+		chess_image (PIL.Image): the whole screenshot
+		tolerance (float): largest channel value which still counts as black
+	Returns:
+		image (np.array): RGB NumPy array of the screenshot
+		x_axis (int): row of the top left pixel of the chessboard
+		y_axis (int): column of the top left pixel of the chessboard
+		bounding_box (tuple): (top, bottom, left, right) of the foreground
+	'''
+	if chess_image.mode != 'RGB':
+		chess_image = chess_image.convert('RGB')
+	image = np.asarray(chess_image)
+	mask = get_foreground(image, tolerance)
+	x_axis, y_axis = get_xy(image, mask)
+
+	return image, x_axis, y_axis, get_bounding_box(mask)
+
+
+def locate_chessboard(chess_image, tolerance = 0):
+	'''
+	Finds the top left pixel of the chessboard, the size of its tiles and the bounding box of
+	everything that is not black.
+
+	Args:
+		chess_image (PIL.Image): the whole screenshot
+		tolerance (float): allowed noise in the black background and within the first tile
+	Returns:
+		x_axis (int): row of the top left pixel of the chessboard
+		y_axis (int): column of the top left pixel of the chessboard
+		tile_size (int): size of one tile in pixels
+		bounding_box (tuple): (top, bottom, left, right) of the foreground
+	'''
+	image, x_axis, y_axis, (top, bottom, left, right) = find_corner(chess_image, tolerance)
+	tile_size = get_tile_size(image, x_axis, y_axis, tolerance)
+	# A tile which runs past the foreground means the run-length edge was not found
+	largest_tile_size = min(bottom - x_axis, right - y_axis) // 8
+	if tile_size > largest_tile_size:
+		tile_size = largest_tile_size
+	if tile_size == 0:
+		raise ValueError('Could not find the size of chessboard tiles')
+
+	return x_axis, y_axis, tile_size, (top, bottom, left, right)
+
+
+def measure_chessboard(chess_image, tolerance = 0):
+	'''
+	Finds the top left pixel and the size of the chessboard without assuming that tiles have
+	a whole number of pixels. The board is taken to span from its top left pixel to the end of
+	the foreground, which also includes partially covered pixels on its edges.
+
+	Args:
+		chess_image (PIL.Image): the whole screenshot
+		tolerance (float): largest channel value which still counts as black
+	Returns:
+		x_axis (int): row of the top left pixel of the chessboard
+		y_axis (int): column of the top left pixel of the chessboard
+		board_size (int): size of the whole chessboard in pixels
+	'''
+	image, x_axis, y_axis, (top, bottom, left, right) = find_corner(chess_image, tolerance)
+	board_size = min(bottom - x_axis, right - y_axis)
+	if board_size < 8:
+		raise ValueError('Could not find the size of the chessboard')
+
+	return x_axis, y_axis, board_size
+
+
+# --------------------------
+# RUNNING A PROGRAM
+def prepare_template_bank(tiles, white_pieces, black_pieces, tile_size):
+	'''
+	Combines pieces with tiles, rescales them to the tile size and flattens them into the
+	template matrix used by get_fen. The result only depends on the sprites and the tile size,
+	so it can be reused for every board with the same tile size.
+
+	Returns:
+		templates (tuple): (labels, templates) as returned by prepare_templates
+	'''
+	final_images = combine_images(tiles, white_pieces, black_pieces)
+	final_images = rescale_images(tile_size, final_images)
+
+	return prepare_templates(final_images)
+
+
+# --------------------------
+# CACHES
+# All caches are OrderedDicts with least recently used entries evicted first. Template banks
+# only depend on the sprites and the tile size and are optionally persisted as .npy files.
+# Verdicts are keyed by the Zobrist hash of the recognized position, and whole results by the
+# hash of the image bytes, since the same screenshots and positions repeat a lot. Decoded
+# sprites and their fingerprints are kept per assets path.
+SPRITE_CACHE_SIZE = 8
+FINGERPRINT_CACHE_SIZE = 64
+TEMPLATE_CACHE_SIZE = 8
+VERDICT_CACHE_SIZE = 100000
+IMAGE_CACHE_SIZE = 10000
+_sprite_cache = OrderedDict()
+_fingerprint_cache = OrderedDict()
+_template_cache = OrderedDict()
+_verdict_cache = OrderedDict()
+_image_cache = OrderedDict()
+cache_stats = {
+	'sprite_hits' : 0,
+	'sprite_misses' : 0,
+	'fingerprint_hits' : 0,
+	'fingerprint_misses' : 0,
+	'template_hits' : 0,
+	'template_misses' : 0,
+	'verdict_hits' : 0,
+	'verdict_misses' : 0,
+	'image_hits' : 0,
+	'image_misses' : 0
+}
+
+
+def cache_get(cache, key, name):
+	'''
+	Returns the cached value or None, and counts the hit or miss in cache_stats.
+	'''
+	if key in cache:
+		cache.move_to_end(key)
+		cache_stats[name + '_hits'] += 1
+		return cache[key]
+	cache_stats[name + '_misses'] += 1
+
+	return None
+
+
+def cache_put(cache, key, value, size):
+	cache[key] = value
+	if len(cache) > size:
+		cache.popitem(last = False)
+
+
+def get_cache_stats():
+	'''
+	Returns:
+		stats (dict): hits, misses and current sizes of all caches in this process
+	'''
+	stats = dict(cache_stats)
+	stats['sprite_size'] = len(_sprite_cache)
+	stats['fingerprint_size'] = len(_fingerprint_cache)
+	stats['template_size'] = len(_template_cache)
+	stats['verdict_size'] = len(_verdict_cache)
+	stats['image_size'] = len(_image_cache)
+
+	return stats
+
+
+def clear_caches():
+	'''
+	Empties the template, verdict and image caches and resets their statistics. Decoded
+	sprites and asset fingerprints are kept, since they only depend on the files.
+	'''
+	_template_cache.clear()
+	_verdict_cache.clear()
+	_image_cache.clear()
+	for name in cache_stats:
+		cache_stats[name] = 0
+
+
+def print_cache_stats():
+	print(json.dumps(dict(get_cache_stats(), pid = os.getpid())), file = sys.stderr)
+
+
+def assets_fingerprint(path):
+	'''
+	Hashes the contents of all sprites in the pieces and tiles folders, so that identical
+	copies of the sprites in different test case folders share cached template banks.
+	Sprites are only read and hashed the first time a path is seen in this process.
+
+	Args:
+		path (str): folder with pieces and tiles subfolders
+	Returns:
+		fingerprint (str): hexadecimal digest of the sprites
+	'''
+	key = str(Path(path).resolve())
+	fingerprint = cache_get(_fingerprint_cache, key, 'fingerprint')
+	if fingerprint is not None:
+		return fingerprint
+
+	digest = hashlib.sha1()
+	for name, file in sorted(get_sprite_files(path).items()):
+		digest.update(name.encode())
+		digest.update(file.read_bytes())
+	fingerprint = digest.hexdigest()[:16]
+	cache_put(_fingerprint_cache, key, fingerprint, FINGERPRINT_CACHE_SIZE)
+
+	return fingerprint
+
+
+def build_template_bank(path, tile_size, cache_dir = None):
+	'''
+	Returns:
+		bank (tuple): (labels, templates, black_tile_color, white_tile_color)
+	'''
+	tiles, white_pieces, black_pieces = load_images(path, cache_dir)
+	labels, templates = prepare_template_bank(tiles, white_pieces, black_pieces, tile_size)
+	black_tile_color, white_tile_color = get_tile_colors(np.array(tiles['black']), np.array(tiles['white']))
+
+	return labels, templates, black_tile_color, white_tile_color
+
+
+def get_template_bank(path, tile_size, fingerprint = None, cache_dir = None):
+	'''
+	Returns the template bank for the sprites in path and the given tile size. Banks are looked
+	up in memory first, then in cache_dir, and only built with PIL if neither has them.
+
+	Args:
+		path (str): folder with pieces and tiles subfolders
+		tile_size (int): size of one tile in pixels
+		fingerprint (str): assets_fingerprint(path), computed if not given
+		cache_dir (str): optional folder where banks are persisted as .npy files
+	Returns:
+		bank (tuple): (labels, templates, black_tile_color, white_tile_color)
+	'''
+	if fingerprint is None:
+		fingerprint = assets_fingerprint(path)
+	key = (fingerprint, int(tile_size))
+	bank = cache_get(_template_cache, key, 'template')
+	if bank is not None:
+		return bank
+
+	bank = None
+	if cache_dir:
+		bank_dir = Path(cache_dir) / fingerprint / str(tile_size)
+		names = ['labels', 'templates', 'black_tile_color', 'white_tile_color']
+		try:
+			arrays = load_arrays(bank_dir, names)
+		except (OSError, ValueError):
+			save_arrays(bank_dir, dict(zip(names, build_template_bank(path, tile_size, cache_dir))))
+			arrays = load_arrays(bank_dir, names)
+		bank = tuple(arrays[name] for name in names)
+	if bank is None:
+		bank = build_template_bank(path, tile_size)
+
+	cache_put(_template_cache, key, bank, TEMPLATE_CACHE_SIZE)
+
+	return bank
+
+
+# --------------------------
+# TEMPLATE PYRAMID
+# Screenshots are resampled to the closest level, so templates are only ever built for these
+# tile sizes, whatever the resolution (or the non-integer scale) of the screenshot.
+PYRAMID_LEVELS = (16, 24, 32, 48, 64)
+
+
+def choose_level(tile_size):
+	'''
+	Returns:
+		level (int): pyramid level closest to tile_size on a logarithmic scale
+	'''
+	return min(PYRAMID_LEVELS, key = lambda level: abs(np.log(level / tile_size)))
+
+
+def build_template_pyramid(path, radius = SEARCH_RADIUS, cache_dir = None):
+	'''
+	Returns:
+		pyramid (dict): 'labels', 'black_tile_color', 'white_tile_color' and 'spectra_<level>'
+			from get_template_spectra for every level in PYRAMID_LEVELS
+	'''
+	tiles, white_pieces, black_pieces = load_images(path, cache_dir)
+	black_tile_color, white_tile_color = get_tile_colors(np.array(tiles['black']), np.array(tiles['white']))
+	combined_images = combine_images(tiles, white_pieces, black_pieces)
+	pyramid = {
+		'black_tile_color' : black_tile_color,
+		'white_tile_color' : white_tile_color,
+		'labels' : np.array([image[-1] for image in combined_images])
+	}
+	for level in PYRAMID_LEVELS:
+		# rescale_images replaces the images in the dict it gets, so every level rescales a copy
+		final_images = rescale_images(level, dict(combined_images))
+		templates = np.stack([final_images[image][..., 0] for image in final_images])
+		pyramid['spectra_{}'.format(level)] = get_template_spectra(templates, level, radius)
+
+	return pyramid
+
+
+def get_template_pyramid(path, fingerprint = None, radius = SEARCH_RADIUS, cache_dir = None):
+	'''
+	Returns the template pyramid for the sprites in path, looked up the same way as
+	get_template_bank: in memory first, then in cache_dir, and only then built.
+
+	Args:
+		path (str): folder with pieces and tiles subfolders
+		fingerprint (str): assets_fingerprint(path), computed if not given
+		radius (int): largest searched offset in pixels
+		cache_dir (str): optional folder where pyramids are persisted as .npy files
+	Returns:
+		pyramid (dict): see build_template_pyramid
+	'''
+	if fingerprint is None:
+		fingerprint = assets_fingerprint(path)
+	key = (fingerprint, 'pyramid', radius)
+	pyramid = cache_get(_template_cache, key, 'template')
+	if pyramid is not None:
+		return pyramid
+
+	if cache_dir:
+		pyramid_dir = Path(cache_dir) / fingerprint / 'pyramid_{}'.format(radius)
+		names = ['labels', 'black_tile_color', 'white_tile_color']
+		names += ['spectra_{}'.format(level) for level in PYRAMID_LEVELS]
+		try:
+			pyramid = load_arrays(pyramid_dir, names)
+		except (OSError, ValueError):
+			save_arrays(pyramid_dir, build_template_pyramid(path, radius, cache_dir))
+			pyramid = load_arrays(pyramid_dir, names)
+	else:
+		pyramid = build_template_pyramid(path, radius)
+
+	cache_put(_template_cache, key, pyramid, TEMPLATE_CACHE_SIZE)
+
+	return pyramid
+
+
+def read_chessboard(chess_image, tolerance = 0):
+	'''
+	Finds the chessboard on the image, see locate_chessboard for tolerance.
+
+	Returns:
+		x_axis (int): row of the top left pixel of the chessboard
+		y_axis (int): column of the top left pixel of the chessboard
+		tile_size (int): size of one tile in pixels
+		chessboard (np.array): extracted chessboard in LA mode
+	'''
+	x_axis, y_axis, tile_size, bounding_box = locate_chessboard(chess_image, tolerance)
+	# Only the chessboard itself is converted to LA, not the whole screenshot
+	board_image = chess_image.crop((y_axis, x_axis, y_axis + tile_size * 8, x_axis + tile_size * 8))
+	chessboard = extract_chessboard(
+		chessboard = np.array(board_image.convert('LA')), 
+		first_x = 0, 
+		first_y = 0, 
+		tile_size = tile_size
+		)
+
+	return x_axis, y_axis, tile_size, chessboard
+
+
+def read_resampled_chessboard(chess_image, tolerance = 0):
+	'''
+	Finds the chessboard on the image and resamples it so that its tiles are exactly one of the
+	pyramid levels in size. See measure_chessboard for tolerance.
+
+	Returns:
+		x_axis (int): row of the top left pixel of the chessboard
+		y_axis (int): column of the top left pixel of the chessboard
+		level (int): pyramid level, the size of one tile of the resampled chessboard
+		chessboard (np.array): resampled chessboard in LA mode
+	'''
+	x_axis, y_axis, board_size = measure_chessboard(chess_image, tolerance)
+	level = choose_level(board_size / 8)
+	board_image = chess_image.crop((y_axis, x_axis, y_axis + board_size, x_axis + board_size))
+	board_image = board_image.convert('LA').resize((level * 8, level * 8), resample = Image.BILINEAR)
+
+	return x_axis, y_axis, level, np.array(board_image)
+
+
+def evaluate_position(chessboard_matrix):
+	'''
+	Finds the player giving the check and whether it is a check mate. The side in check is
+	mated if it has no legal move, including blocks and captures of the checking piece.
+
+	Args:
+		chessboard_matrix (list): 8 rows of 8 characters, '*' for empty squares
+	Returns:
+		player (str): 'W', 'B', '-' or None if it could not be determined
+		check_mate (str): 'check_mate', 'not_check_mate' or None if there is no check
+	'''
+	position = from_matrix(chessboard_matrix)
+	key = zobrist_hash(position)
+	verdict = cache_get(_verdict_cache, key, 'verdict')
+	if verdict is None:
+		verdict = evaluate(position)
+		cache_put(_verdict_cache, key, verdict, VERDICT_CACHE_SIZE)
+
+	return verdict
+
+
+def record_time(timings, stage, start):
+	'''
+	Stores the time since start as the time of a stage, if timings is a dict.
+
+	Returns:
+		now (float): time.perf_counter() at the end of the stage
+	'''
+	now = time.perf_counter()
+	if timings is not None:
+		timings[stage] = now - start
+
+	return now
+
+
+def recognize_board(filename, path, fingerprint = None, cache_dir = None, tolerance = 0, image_cache = False,
+	matching = 'exact', timings = None):
+	'''
+	Runs the whole pipeline on one chessboard image.
+
+	Args:
+		filename (str): path to the chessboard image, or an open binary file with it
+		path (str): folder with pieces and tiles subfolders
+		fingerprint (str): assets_fingerprint(path), computed if not given
+		cache_dir (str): optional folder where template banks are persisted
+		tolerance (float): allowed difference from exact colors, both for the black background
+			around the chessboard and for empty tiles, e.g. 16 for JPEG screenshots saved at
+			quality 90 or better
+		image_cache (bool): if True, byte-identical images return cached results without recognition
+		matching (str): 'exact' for screenshots with a whole number of pixels per tile, or 'ncc' to
+			resample the chessboard to the template pyramid and search small offsets, which also
+			works for any other scale
+		timings (dict): optional dict which gets the seconds spent in every stage ('decode',
+			'localize', 'templates', 'match' and 'rules'), only 'decode' for image cache hits
+	Returns:
+		x_axis, y_axis, fen, player, check_mate: the same values as run_program
+	'''
+	start = time.perf_counter()
+	if image_cache:
+		if fingerprint is None:
+			fingerprint = assets_fingerprint(path)
+		if hasattr(filename, 'read'):
+			data = filename.read()
+		else:
+			with open(filename, 'rb') as file:
+				data = file.read()
+		key = (hashlib.blake2b(data, digest_size = 16).digest(), fingerprint, tolerance, matching)
+		results = cache_get(_image_cache, key, 'image')
+		if results is not None:
+			record_time(timings, 'decode', start)
+			return results
+		chess_image = Image.open(io.BytesIO(data))
+	else:
+		chess_image = Image.open(filename)
+	chess_image.load()
+	start = record_time(timings, 'decode', start)
+
+	if matching == 'ncc':
+		x_axis, y_axis, level, chessboard = read_resampled_chessboard(chess_image, tolerance)
+		start = record_time(timings, 'localize', start)
+		pyramid = get_template_pyramid(path, fingerprint = fingerprint, cache_dir = cache_dir)
+		start = record_time(timings, 'templates', start)
+		fen, chessboard_matrix = get_fen_ncc(
+			chessboard,
+			level,
+			pyramid['labels'],
+			pyramid['spectra_{}'.format(level)],
+			pyramid['black_tile_color'],
+			pyramid['white_tile_color'],
+			tolerance = tolerance
+			)
+	else:
+		x_axis, y_axis, tile_size, chessboard = read_chessboard(chess_image, tolerance)
+		start = record_time(timings, 'localize', start)
+		labels, templates, black_tile_color, white_tile_color = get_template_bank(
+			path,
+			tile_size,
+			fingerprint = fingerprint,
+			cache_dir = cache_dir
+			)
+		start = record_time(timings, 'templates', start)
+
+		fen, chessboard_matrix = get_fen(
+			chessboard, 
+			None,
+			tile_size,
+			black_tile_color,
+			white_tile_color,
+			templates = (labels, templates),
+			tolerance = tolerance
+			)
+	start = record_time(timings, 'match', start)
+	player, check_mate = evaluate_position(chessboard_matrix.split('/'))
+	record_time(timings, 'rules', start)
+	results = (x_axis, y_axis, fen, player, check_mate)
+	if image_cache:
+		cache_put(_image_cache, key, results, IMAGE_CACHE_SIZE)
+
+	return results
+
+
+def run_program(path, cache_dir = None):
+	filename = None
+	for file in os.listdir(path):
+		if file.endswith('.png'):
+			filename = os.path.join(path, file)
+
+	return recognize_board(filename, path, cache_dir = cache_dir)
+
+
+# --------------------------
+# BATCH MODE
+BATCH_FIELDS = ['image', 'corner', 'fen', 'check', 'mate', 'error']
+_worker_state = {}
+
+
+def format_result(filename, results):
+	'''
+	Formats results of recognize_board the same way they are printed for a single board.
+	'''
+	x_axis, y_axis, fen, player, check_mate = results
+	if player == '-' or check_mate == 'not_check_mate':
+		mate = '0'
+	elif check_mate == 'check_mate':
+		mate = '1'
+	else:
+		mate = ''
+
+	return {
+		'image' : filename,
+		'corner' : str(x_axis) + ',' + str(y_axis),
+		'fen' : fen,
+		'check' : player if player else '',
+		'mate' : mate,
+		'error' : ''
+	}
+
+
+def init_worker(assets_path, fingerprint, cache_dir = None, tolerance = 0, image_cache = False, stats = False,
+	matching = 'exact'):
+	# The fingerprint comes from run_batch, so that workers do not hash the sprites again
+	cache_put(_fingerprint_cache, str(Path(assets_path).resolve()), fingerprint, FINGERPRINT_CACHE_SIZE)
+	_worker_state['path'] = assets_path
+	_worker_state['fingerprint'] = fingerprint
+	_worker_state['cache_dir'] = cache_dir
+	_worker_state['tolerance'] = tolerance
+	_worker_state['image_cache'] = image_cache
+	_worker_state['matching'] = matching
+	if stats and multiprocessing.current_process().name != 'MainProcess':
+		# Pool workers print their cache statistics when they exit
+		multiprocessing.util.Finalize(None, print_cache_stats, exitpriority = 10)
+
+
+def recognize_worker(filename):
+	try:
+		results = recognize_board(
+			filename,
+			_worker_state['path'],
+			fingerprint = _worker_state['fingerprint'],
+			cache_dir = _worker_state['cache_dir'],
+			tolerance = _worker_state['tolerance'],
+			image_cache = _worker_state['image_cache'],
+			matching = _worker_state['matching']
+			)
+	except Exception as error:
+		# One unreadable image should not stop the whole batch, the error is reported in its row
+		return {
+			'image' : filename,
+			'corner' : '',
+			'fen' : '',
+			'check' : '',
+			'mate' : '',
+			'error' : '{}: {}'.format(type(error).__name__, error)
+		}
+
+	return format_result(filename, results)
+
+
+def list_images(source):
+	'''
+	Yields chessboard images from a directory (all .png and .jpg files, recursively and sorted,
+	skipping pieces and tiles sprite folders), or paths listed one per line in a text file or on
+	the standard input ('-').
+	'''
+	if os.path.isdir(source):
+		for root, directories, files in os.walk(source):
+			directories[:] = sorted(directory for directory in directories if directory not in ('pieces', 'tiles'))
+			for file in sorted(files):
+				if file.lower().endswith(('.png', '.jpg', '.jpeg')):
+					yield os.path.join(root, file)
+	elif source == '-':
+		for line in sys.stdin:
+			if line.strip():
+				yield line.strip()
+	else:
+		with open(source) as stream:
+			for line in stream:
+				if line.strip():
+					yield line.strip()
+
+
+def run_batch(images, assets_path, output, output_format = 'csv', workers = 1, chunksize = 16, cache_dir = None,
+	tolerance = 0, image_cache = False, stats = False, matching = 'exact'):
+	'''
+	Recognizes every image and streams one result per image in the input order.
+	Template banks are prepared once per tile size and cached, see get_template_bank.
+	Assets are checked before any image is read, so a wrong assets path or cache_dir fails
+	at once instead of producing a row with an error for every image. Worker processes
+	memory-map the decoded sprites from cache_dir, or from a temporary folder without it.
+
+	Args:
+		images (iterable): paths to chessboard images
+		assets_path (str): folder with pieces and tiles subfolders
+		output (file): where results are written
+		output_format (str): 'csv' or 'jsonl'
+		workers (int): number of worker processes, 1 runs everything in this process
+		chunksize (int): number of images sent to a worker at once
+		cache_dir (str): optional folder where template banks are persisted
+		tolerance (float): allowed difference from exact colors, see recognize_board
+		image_cache (bool): if True, byte-identical images are recognized only once per process
+		stats (bool): if True, every process prints its cache statistics to stderr when it is done
+		matching (str): 'exact' or 'ncc', see recognize_board
+	Returns:
+		failed (int): number of images which could not be recognized
+	Raises:
+		FileNotFoundError, ValueError: if the sprites in assets_path are missing or incomplete
+	'''
+	fingerprint = assets_fingerprint(assets_path)
+	if workers > 1 and not cache_dir:
+		# Sharing through files does not depend on the start method of the worker processes
+		with tempfile.TemporaryDirectory(prefix = 'checkmate-') as temporary_dir:
+			return run_batch(images, assets_path, output, output_format, workers, chunksize, temporary_dir,
+				tolerance, image_cache, stats, matching)
+
+	worker_arguments = (assets_path, fingerprint, cache_dir, tolerance, image_cache, stats, matching)
+	# Decode the sprites once here, workers memory-map the saved arrays
+	load_sprite_arrays(assets_path, cache_dir)
+	if output_format == 'csv':
+		writer = csv.DictWriter(output, fieldnames = BATCH_FIELDS)
+		writer.writeheader()
+		write = writer.writerow
+	else:
+		write = lambda row: output.write(json.dumps(row) + '\n')
+
+	failed = 0
+	if workers > 1:
+		# The pool is terminated when writing fails, e.g. when the output pipe is closed
+		with multiprocessing.Pool(workers, initializer = init_worker, initargs = worker_arguments) as pool:
+			for row in pool.imap(recognize_worker, images, chunksize = chunksize):
+				write(row)
+				failed += bool(row['error'])
+			# Closing instead of terminating lets workers run their exit handlers
+			pool.close()
+			pool.join()
+	else:
+		init_worker(*worker_arguments)
+		for filename in images:
+			row = recognize_worker(filename)
+			write(row)
+			failed += bool(row['error'])
+		if stats:
+			print_cache_stats()
+
+	return failed
+
+
+def parse_arguments():
+	parser = argparse.ArgumentParser(description = 'Batch chessboard recognition.')
+	parser.add_argument('source', help = 'folder with .png images, file with one image path per line, or - for stdin')
+	parser.add_argument('--assets', required = True, help = 'folder with pieces and tiles subfolders')
+	parser.add_argument('--format', choices = ['csv', 'jsonl'], default = 'csv')
+	parser.add_argument('--workers', type = int, default = os.cpu_count())
+	parser.add_argument('--output', help = 'output file, standard output by default')
+	parser.add_argument('--cache-dir', help = 'folder where template banks are persisted as .npy files')
+	parser.add_argument('--tolerance', type = float, default = 0,
+		help = 'allowed difference from black around the board and from the tile colors, e.g. 16 for JPEG '
+		'screenshots saved at quality 90 or better (heavier compression is not supported)')
+	parser.add_argument('--image-cache', action = 'store_true',
+		help = 'return cached results for byte-identical images')
+	parser.add_argument('--stats', action = 'store_true', help = 'print cache hits and misses to stderr')
+	parser.add_argument('--matching', choices = ['exact', 'ncc'], default = 'exact',
+		help = 'ncc resamples boards to a template pyramid, for screenshots at any scale')
+
+	return parser.parse_args()
+
+
+if __name__ == "__main__":
+	if len(sys.argv) > 1:
+		arguments = parse_arguments()
+		output = open(arguments.output, 'w', newline = '') if arguments.output else sys.stdout
+		try:
+			failed = run_batch(
+				list_images(arguments.source),
+				arguments.assets,
+				output,
+				output_format = arguments.format,
+				workers = arguments.workers,
+				cache_dir = arguments.cache_dir,
+				tolerance = arguments.tolerance,
+				image_cache = arguments.image_cache,
+				stats = arguments.stats,
+				matching = arguments.matching
+				)
+		except BrokenPipeError:
+			# The reader of the output went away (e.g. head), stop without a traceback
+			os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+			sys.exit(1)
+		except (OSError, ValueError) as error:
+			sys.exit('checkmate.py: ' + str(error))
+		if failed:
+			sys.exit('checkmate.py: {} images could not be recognized, see the error column'.format(failed))
+		sys.exit()
+
+	path = input()
+	results = run_program(path)
+	print(str(results[0]) + ',' + str(results[1]))
+	print(results[2])
+	if results[3]:
+		print(results[3])
+	else:
+		print()
+	if results[3] == '-':
+		print(0)
+	elif results[4] == 'not_check_mate':
+		print(0)
+	elif results[4] == 'check_mate':
+		print(1)
+	else:
+		print()
@@ -0,0 +1,155 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from itertools import islice
+
+from bitboard import from_fen, evaluate, get_game_state, has_legal_move
+
+
+FIELDS = ['fen', 'check', 'mate', 'state', 'error']
+
+
+def get_state(position, white, player, check_mate):
+	'''
+	Same as bitboard.get_game_state, but reuses the result of bitboard.evaluate for the same
+	position, so that the check and legal move tests are not done twice.
+
+	Args:
+		position (dict): piece character -> bitboard
+		white (bool): the side to move
+		player (str), check_mate (str): the result of evaluate(position)
+	Returns:
+		state (str): 'check_mate', 'stalemate', 'check' or 'normal'
+	'''
+	if player == ('B' if white else 'W'):
+		# evaluate already searched for a legal move of the side to move
+		return 'check_mate' if check_mate == 'check_mate' else 'check'
+	if player == '-':
+		return 'normal' if has_legal_move(position, white) else 'stalemate'
+
+	# The side which is not to move is in check, evaluate says nothing about the side to move
+	return get_game_state(position, white)
+
+
+def analyze_fen(fen):
+	'''
+	Runs check and mate detection on one position given in FEN.
+
+	The check and mate columns follow the output of checkmate.py: check is 'W', 'B' or '-',
+	and mate is '1' for a check mate and '0' otherwise. If the FEN also has the side to move,
+	state is the state of that side ('check_mate', 'stalemate', 'check' or 'normal').
+
+	Args:
+		fen (str): FEN string, only the piece placement field is required
+	Returns:
+		row (dict): one output row with FIELDS as keys
+	'''
+	row = {'fen' : fen, 'check' : '', 'mate' : '', 'state' : '', 'error' : ''}
+	try:
+		position = from_fen(fen)
+	except ValueError as error:
+		row['error'] = str(error)
+		return row
+
+	player, check_mate = evaluate(position)
+	if player is None:
+		row['error'] = 'a king is missing'
+		return row
+	row['check'] = player
+	row['mate'] = '1' if check_mate == 'check_mate' else '0'
+
+	fields = fen.split()
+	if len(fields) > 1 and fields[1] in ('w', 'b'):
+		row['state'] = get_state(position, fields[1] == 'w', player, check_mate)
+
+	return row
+
+
+def analyze_chunk(fens):
+	return [analyze_fen(fen) for fen in fens]
+
+
+def read_positions(source):
+	'''
+	Yields FEN strings, one per line, from a file or from the standard input ('-').
+	Empty lines and lines starting with # are skipped.
+	'''
+	if source == '-':
+		yield from read_lines(sys.stdin)
+	else:
+		with open(source) as stream:
+			yield from read_lines(stream)
+
+
+def read_lines(stream):
+	'''
+	Yields the stripped lines of stream, without empty lines and # comments.
+	'''
+	for line in stream:
+		line = line.strip()
+		if line and not line.startswith('#'):
+			yield line
+
+
+def chunked(iterable, size):
+	iterator = iter(iterable)
+	chunk = list(islice(iterator, size))
+	while chunk:
+		yield chunk
+		chunk = list(islice(iterator, size))
+
+
+def run_analysis(positions, output, output_format = 'csv', workers = 1, chunksize = 1000):
+	'''
+	Analyzes a stream of FEN strings and writes one row per position in the input order.
+	Positions are sent to workers in chunks, so that the cost of passing data between
+	processes is paid once per chunk and not once per position.
+
+	Args:
+		positions (iterable): FEN strings
+		output (file): where results are written
+		output_format (str): 'csv' or 'jsonl'
+		workers (int): number of worker processes, 1 runs everything in this process
+		chunksize (int): number of positions sent to a worker at once
+	'''
+	if output_format == 'csv':
+		writer = csv.DictWriter(output, fieldnames = FIELDS)
+		writer.writeheader()
+		write = writer.writerows
+	else:
+		write = lambda rows: output.write(''.join(json.dumps(row) + '\n' for row in rows))
+
+	chunks = chunked(positions, chunksize)
+	if workers > 1:
+		with multiprocessing.Pool(workers) as pool:
+			for rows in pool.imap(analyze_chunk, chunks):
+				write(rows)
+	else:
+		for chunk in chunks:
+			write(analyze_chunk(chunk))
+
+
+def parse_arguments():
+	parser = argparse.ArgumentParser(description = 'Check and mate detection for positions given in FEN.')
+	parser.add_argument('source', nargs = '?', default = '-', help = 'file with one FEN per line, - for stdin')
+	parser.add_argument('--format', choices = ['csv', 'jsonl'], default = 'csv')
+	parser.add_argument('--workers', type = int, default = os.cpu_count())
+	parser.add_argument('--chunksize', type = int, default = 1000)
+	parser.add_argument('--output', help = 'output file, standard output by default')
+
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	arguments = parse_arguments()
+	output = open(arguments.output, 'w', newline = '') if arguments.output else sys.stdout
+	run_analysis(
+		read_positions(arguments.source),
+		output,
+		output_format = arguments.format,
+		workers = arguments.workers,
+		chunksize = arguments.chunksize
+		)